@@ -1,27 +1,61 @@
-from src.utils.topic_identifier import TopicIdentifier
-from src.utils.config_loader import ConfigLoader
-from src.question_generators.llm_generator import LLMQuestionGenerator
-from src.question_generators.rag_generator import RAGQuestionGenerator
-from src.question_generators.conceptmap_generator import ConceptMapQuestionGenerator
+import argparse
+from src.utils.metrics import metrics
+from src.utils.startup_timer import startup_timer
+from src.question_generators.registry import GENERATORS, load_generator_class
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate MCQs for a physics topic.")
+    parser.add_argument('--methods', nargs='+', default=list(GENERATORS), choices=list(GENERATORS),
+                        help="Generation methods to run (default: all)")
+    parser.add_argument('--grade', type=int, default=9)
+    parser.add_argument('--startup-report', action='store_true',
+                        help="Print import and component initialization timings")
+    parser.add_argument('--resume', action='store_true', default=None,
+                        help="Reuse questions already in the JSONL output instead of regenerating them "
+                             "(default: storage.resume in configs/output_config.yaml)")
+    parser.add_argument('--metrics', default=None,
+                        help="Write per-stage latency, token, retry and cache metrics to this file "
+                             "(.prom for Prometheus text, otherwise JSON)")
+    return parser.parse_args()
 
 def main():
-    config_loader = ConfigLoader()
-    topic_identifier = TopicIdentifier(config_loader)
-    
+    args = parse_args()
+
+    with startup_timer.measure("init:config_loader"):
+        from src.utils.config_loader import ConfigLoader
+        config_loader = ConfigLoader()
+
+    with startup_timer.measure("import:topic_identifier"):
+        from src.utils.topic_identifier import TopicIdentifier
+    with startup_timer.measure("init:topic_identifier"):
+        topic_identifier = TopicIdentifier(config_loader)
+
     test_input = input("Enter your query: ")
     topic = topic_identifier(test_input)
-    
-    # Each generator only needs to implement its specific parts
-    llm_gen = LLMQuestionGenerator(config_loader)
-    rag_gen = RAGQuestionGenerator(config_loader)
-    conceptmap_gen = ConceptMapQuestionGenerator(config_loader)
-    
+
+    # Only the requested generators are imported and built; heavy clients
+    # (LLM, embeddings, database) are created on first use
+    generators = {}
+    for name in args.methods:
+        with startup_timer.measure(f"import:{name}"):
+            generator_class = load_generator_class(name)
+        with startup_timer.measure(f"init:{name}"):
+            generators[name] = generator_class(config_loader)
+
     # The common logic is handled by the base class
-    llm_results = llm_gen.generate_all_questions(topic, grade = 9, context=None)
-    rag_results = rag_gen.generate_all_questions(topic, grade = 9, context=None)
-    conceptmap_results = conceptmap_gen.generate_all_questions(topic, grade = 9, context=None)
-    
-    return llm_results, rag_results, conceptmap_results
+    results = {
+        name: generator.generate_all_questions(topic, grade=args.grade, context=None, resume=args.resume)
+        for name, generator in generators.items()
+    }
+
+    if args.startup_report:
+        print(startup_timer.report())
+
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"Metrics written to {args.metrics}")
+
+    return results
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
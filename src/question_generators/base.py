@@ -1,15 +1,21 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
-import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from src.utils.metrics import metrics
+from src.utils.question_writer import get_question_writer, make_record, write_json_atomic
+from src.utils.response_parser import schema_from_format
+import os
 
 class BaseQuestionGenerator(ABC):
     """Abstract base class for question generators."""
     
     def __init__(self, config_loader):
+        self.project_root = config_loader.project_root
         self.model_config = config_loader.load_model_config()
         self.prompt_config = config_loader.load_prompt_config()
         self.skill_config = config_loader.load_skill_config()
         self.output_config = config_loader.load_output_config()
+        self.generation_schema = schema_from_format(self.output_config['formats']['generation'])
         self._initialize_components()
     
     @abstractmethod
@@ -32,35 +38,114 @@ class BaseQuestionGenerator(ABC):
         """Generate a single question. To be implemented by each method."""
         pass
 
-    def generate_all_questions(self, topic: str, grade: int, context: str) -> Dict:
+    def get_max_concurrency(self) -> int:
+        """Return the configured number of skills generated in parallel (1 = sequential)."""
+        concurrency_config = self.model_config.get('concurrency') or {}
+        return max(1, int(concurrency_config.get('max_workers', 1)))
+
+    def get_model_name(self) -> str:
+        return self.model_config['model'].split('/')[-1]
+
+    def get_output_dir(self) -> str:
+        storage_config = self.output_config.get('storage') or {}
+        return str(self.project_root / storage_config.get('output_dir', 'outputs'))
+
+    def get_writer(self):
+        """Shared JSONL writer for this method and model."""
+        filename = f"{self.get_method_name()}_{self.get_model_name()}.jsonl"
+        return get_question_writer(os.path.join(self.get_output_dir(), filename))
+
+    def _generate_for_skill(self, topic: str, skill: str, grade: int, context: Optional[str]) -> Optional[Dict]:
         """
-        Generate questions for all skills. Common implementation for all methods.
-        Each method only needs to implement generate_question().
+        Generate the question for one skill, passing context only to methods that use it.
+        The question is appended to the JSONL output as soon as it is produced.
+        End-to-end latency and outcome are recorded in metrics under question.<method>.
         """
-        responses = {
-            "topic": topic,
-            "questions": []
-        }
+        output_format_generation = self.output_config['formats']['generation']
+        stage = f"question.{self.get_method_name()}"
         
-        for skill in self.skill_config['skills']['list']:
-            output_format_generation = self.output_config['formats']['generation']
-            
+        with metrics.span(stage):
             if self.needs_context():
                 question = self.generate_question(topic, skill, output_format_generation, grade, context)
             else:
                 question = self.generate_question(topic, skill, output_format_generation, grade)
-                
+        metrics.increment(stage, 'valid' if question else 'invalid')
+        
+        if question:
+            self.get_writer().write(
+                make_record(question, topic, grade, skill, self.get_method_name(), self.get_model_name())
+            )
+        return question
+
+    def _generate_concurrently(self, topic: str, skills: List[str], grade: int, context: Optional[str], max_concurrency: int) -> List[Optional[Dict]]:
+        """
+        Fan the skills out over a thread pool and return the results in skill order.
+        Methods whose questions depend on each other override this.
+        """
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(skills))) as executor:
+            futures = [
+                executor.submit(self._generate_for_skill, topic, skill, grade, context)
+                for skill in skills
+            ]
+            return [future.result() for future in futures]
+
+    def generate_all_questions(self, topic: str, grade: int, context: str, max_concurrency: Optional[int] = None, resume: Optional[bool] = None) -> Dict:
+        """
+        Generate questions for all skills. Common implementation for all methods.
+        Each method only needs to implement generate_question(). Skills left without
+        a question are listed under missing_skills.
+        
+        Args:
+            max_concurrency: Number of skills generated in parallel. Defaults to
+                concurrency.max_workers in the model config; 1 runs sequentially.
+            resume: Reuse questions already in the JSONL output for this topic, grade
+                and method instead of regenerating them. Defaults to storage.resume
+                in the output config.
+        """
+        responses = {
+            "topic": topic,
+            "questions": [],
+            "missing_skills": []
+        }
+        
+        skills = list(self.skill_config['skills']['list'])
+        if max_concurrency is None:
+            max_concurrency = self.get_max_concurrency()
+        
+        if resume is None:
+            resume = (self.output_config.get('storage') or {}).get('resume', False)
+        
+        # Resume: reuse questions already written for this topic, grade and method
+        completed = {}
+        if resume:
+            method = self.get_method_name()
+            writer = self.get_writer()
+            records = {skill: writer.get_record((topic, grade, skill, method)) for skill in skills}
+            completed = {skill: record['question'] for skill, record in records.items() if record}
+            if completed:
+                print(f"Resuming {method} for {topic}: {len(completed)} skills already generated")
+        
+        pending = [skill for skill in skills if skill not in completed]
+        if max_concurrency > 1 and len(pending) > 1:
+            new_questions = self._generate_concurrently(topic, pending, grade, context, max_concurrency)
+        else:
+            new_questions = [self._generate_for_skill(topic, skill, grade, context) for skill in pending]
+        generated = dict(zip(pending, new_questions))
+        
+        for skill in skills:
+            question = completed.get(skill) or generated.get(skill)
             if question:
                 responses["questions"].append(question)
+            else:
+                responses["missing_skills"].append(skill)
         
         self.save_to_json(responses, topic)
         return responses
 
     def save_to_json(self, data: Dict, topic: str) -> None:
-        """Save generated questions to JSON file."""
-        model_name = self.model_config['model'].split('/')[-1]
+        """Save generated questions to JSON file in the output directory."""
+        model_name = self.get_model_name()
         method = self.get_method_name()
-        filename = f"{method}_{topic}_{model_name}.json"
+        filename = f"{method}_{topic}_{model_name}.json".replace(os.sep, '_')
         
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+        write_json_atomic(os.path.join(self.get_output_dir(), filename), data)
\ No newline at end of file
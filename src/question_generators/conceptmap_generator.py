@@ -1,16 +1,25 @@
 from src.question_generators.base import BaseQuestionGenerator
-from langchain_together import ChatTogether
-from langchain_community.utilities import SQLDatabase
-from typing import Dict, Optional, List
+from src.utils.concept_map_db import ConceptMapRepository, format_context
+from src.utils.concept_map_store import load_concept_map_store
+from src.utils.llm_client import build_llm
+from src.utils.metrics import metrics
+from src.utils.response_parser import parse_json_response
+from src.utils.near_duplicates import NearDuplicateIndex
+from src.utils.startup_timer import startup_timer
+from src.utils.topic_index import TopicIndex, load_topic_index
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Optional, List, Tuple
 from dotenv import load_dotenv
-import os
+import threading
 import json
 
 class ConceptMapGenerator:
     """Handles the generation of individual questions."""
-    def __init__(self, llm, prompt):
+    def __init__(self, llm, prompt, schema=None):
         self.llm = llm
         self.base_prompt = prompt
+        self.schema = schema
     
     def generate_question(self, skill: str, skill_requirement: str, topic: str, context: str, question_history: List[str], grade: int, output_format_generation: str) -> Dict:
         """Generate a single question."""
@@ -24,10 +33,7 @@ class ConceptMapGenerator:
             output_format_generation=output_format_generation
         )
         response = self.llm.invoke(prompt)
-        cleaned_content = response.content.strip()
-        if cleaned_content.startswith("```json"):
-            cleaned_content = cleaned_content[7:-3]
-        return json.loads(cleaned_content)
+        return parse_json_response(response.content, self.schema)
 
 class ConceptMapEvaluator:
     """Evaluates questions for validity and uniqueness."""
@@ -44,7 +50,8 @@ class ConceptMapEvaluator:
                 output_format_evaluation=output_format_evaluation
             )
             response = self.llm.invoke(prompt)
-            evaluation = json.loads(response.content)
+            evaluation = parse_json_response(response.content)
+            metrics.increment('evaluation', 'valid' if evaluation.get('valid') else 'invalid')
             return evaluation
         except Exception as e:
             print(f"Evaluation error: {str(e)}")
@@ -80,11 +87,13 @@ class ConceptMapFixer:
                 )
 
             response = self.llm.invoke(prompt)
-            fixed_question = json.loads(response.content)
+            fixed_question = parse_json_response(response.content)
+            metrics.increment('fixing', 'valid')
             return fixed_question
 
         except Exception as e:
             print(f"Fix error: {str(e)}")
+            metrics.increment('fixing', 'invalid')
             return None
 
 class ConceptMapQuestionGenerator(BaseQuestionGenerator):
@@ -94,34 +103,48 @@ class ConceptMapQuestionGenerator(BaseQuestionGenerator):
         """Initialize all components."""
         load_dotenv()
         
-        self.llm = ChatTogether(
-            model=self.model_config['model'],
-            temperature=self.model_config['temperature']['generation_temperature']
-        )
+        self.llm = build_llm(self.model_config, 'generation_temperature', stage='generation')
+        self.fix_llm = build_llm(self.model_config, 'generation_temperature', stage='fixing')
         
-        self.db = SQLDatabase.from_uri(
-            f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@"
-            f"{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-        )
+        # Topic matching and evaluation are deterministic checks
+        self.matching_llm = build_llm(self.model_config, 'evaluation_temperature', stage='topic_matching')
+        self.evaluation_llm = build_llm(self.model_config, 'evaluation_temperature', stage='evaluation')
+        
+        # Database connection is opened on first use, see the db property
+        self._db = None
+        self._db_lock = threading.Lock()
         
         self.generator = ConceptMapGenerator(
             self.llm,
-            self.prompt_config['prompts']['conceptmap_prompt']
+            self.prompt_config['prompts']['conceptmap_prompt'],
+            self.generation_schema
         )
         
         self.evaluator = ConceptMapEvaluator(
-            self.llm,
+            self.evaluation_llm,
             self.prompt_config['prompts']['conceptmap_evaluation_prompt']
         )
         
         self.fixer = ConceptMapFixer(
-            self.llm,
+            self.fix_llm,
             self.prompt_config['prompts']['conceptmap_fix_prompt']
         )
         
         self.topic_matcher_template = self.prompt_config['prompts']['topic_identification_conceptmap_prompt']
+        self.concept_map_config = self.model_config.get('concept_map') or {}
+        
+        # Memoized topic -> topic_id matches
+        self._topic_ids: Dict[str, str] = {}
+        self._topic_match_locks: Dict[str, threading.Lock] = {}
+        self._topic_match_lock = threading.Lock()
 
-        self.generated_questions = []
+        # Near-duplicate index over the most recent questions; prompts only get a small relevant window
+        self._history_lock = threading.Lock()
+        self.history_index = NearDuplicateIndex(
+            max_entries=self.concept_map_config.get('history_max_entries', 500)
+        )
+        # Writer key (topic, grade, skill, method) -> index entry id, oldest first
+        self._history_entry_ids: "OrderedDict[Tuple, int]" = OrderedDict()
     
     def needs_context(self) -> bool:
         return True
@@ -129,48 +152,192 @@ class ConceptMapQuestionGenerator(BaseQuestionGenerator):
     def get_method_name(self) -> str:
         return "ConceptMap"
 
-    def _find_matching_topic_id(self, topic: str) -> str:
-        """Find matching topic ID from database."""
-        try:
-            query = "SELECT topic_name, topic_id FROM topics;"
-            topics = self.db.run_no_throw(query)
-            
-            if not topics:
-                raise ValueError("No topics found in database")
-            
-            prompt = self.topic_matcher_template.format(
-                topic_of_interest=topic,
-                topics="\n".join(topics)
-            )
+    @property
+    def db(self):
+        """
+        Concept map data source, opened on first access. Either the pooled Postgres
+        repository or, with concept_map.backend: memory, the in-process CSV store.
+        """
+        if self._db is None:
+            with self._db_lock:
+                if self._db is None:
+                    with startup_timer.measure("lazy:conceptmap_db"):
+                        backend = self.concept_map_config.get('backend', 'postgres')
+                        if backend == 'memory':
+                            concept_map_dir = self.project_root / self.concept_map_config.get('concept_map_dir', 'data/concept_map')
+                            self._db = load_concept_map_store(str(concept_map_dir))
+                        elif backend == 'postgres':
+                            self._db = ConceptMapRepository.from_env(
+                                pool_size=self.concept_map_config.get('db_pool_size', 5)
+                            )
+                        else:
+                            raise ValueError(f"Unknown concept_map backend: {backend}")
+        return self._db
+
+    def _generate_concurrently(self, topic: str, skills: List[str], grade: int, context: Optional[str], max_concurrency: int) -> List[Optional[Dict]]:
+        """
+        Generate skills in parallel while keeping the question_history dependency.
+        
+        In "waves" mode skills run in groups of max_concurrency and every wave sees the
+        questions of the earlier waves. In "dedupe" mode all skills run at once and any
+        question duplicating an earlier one is regenerated sequentially with full history.
+        """
+        history_mode = (self.model_config.get('concurrency') or {}).get('conceptmap_history_mode', 'waves')
+        
+        if history_mode == 'dedupe':
+            questions = super()._generate_concurrently(topic, skills, grade, context, max_concurrency)
+            return self._regenerate_duplicates(topic, skills, grade, context, questions)
+        
+        if history_mode != 'waves':
+            raise ValueError(f"Unknown conceptmap_history_mode: {history_mode}")
+        
+        questions = []
+        for start in range(0, len(skills), max_concurrency):
+            wave = skills[start:start + max_concurrency]
+            questions.extend(super()._generate_concurrently(topic, wave, grade, context, max_concurrency))
+        return questions
+
+    def _regenerate_duplicates(self, topic: str, skills: List[str], grade: int, context: Optional[str], questions: List[Optional[Dict]]) -> List[Optional[Dict]]:
+        """Replace questions that near-duplicate an earlier one, in skill order."""
+        keys = [(topic, grade, skill, self.get_method_name()) for skill in skills]
+        
+        # Take the batch out of the history and add it back one skill at a time
+        for key, question in zip(keys, questions):
+            if question:
+                self._forget_question(key)
+        
+        for index, question in enumerate(questions):
+            if not question:
+                continue
             
-            response = self.llm.invoke(prompt)
-            return response.content.strip()
+            if self._find_duplicates(question):
+                print(f"Duplicate question for {skills[index]}, regenerating")
+                # The duplicate is already in the JSONL output; keep resume from restoring it
+                self.get_writer().discard(keys[index])
+                # generate_question records the replacement itself
+                questions[index] = self._generate_for_skill(topic, skills[index], grade, context)
+            else:
+                self._record_question(keys[index], question)
+        
+        return questions
+
+    def _record_question(self, key: Tuple, question: Dict) -> None:
+        """
+        Add a generated question to the near-duplicate index under its writer key,
+        replacing an earlier question for the same key.
+        """
+        with self._history_lock:
+            previous = self._history_entry_ids.pop(key, None)
+            if previous is not None:
+                self.history_index.remove(previous)
+            self._history_entry_ids[key] = self.history_index.add(question.get('question', ''))
+            # Entries the index evicted are the oldest keys
+            while len(self._history_entry_ids) > len(self.history_index):
+                self._history_entry_ids.popitem(last=False)
+
+    def _forget_question(self, key: Tuple) -> None:
+        with self._history_lock:
+            entry_id = self._history_entry_ids.pop(key, None)
+            if entry_id is not None:
+                self.history_index.remove(entry_id)
+
+    def _question_history(self, text: str) -> List[str]:
+        """The few past questions most relevant to text, used in place of the full history."""
+        return self.history_index.most_similar(text, k=self.concept_map_config.get('history_window', 5))
+
+    def _find_duplicates(self, question: Dict) -> List:
+        return self.history_index.find_duplicates(
+            question.get('question', ''),
+            threshold=self.concept_map_config.get('duplicate_threshold', 0.6)
+        )
+
+    def _evaluate_question(self, question: Dict) -> Dict:
+        """
+        Evaluate a question. Near-duplicates of earlier questions are rejected locally;
+        otherwise the evaluator compares against a window of similar past questions.
+        """
+        duplicates = self._find_duplicates(question)
+        if duplicates:
+            metrics.increment('evaluation', 'local_duplicates')
+            metrics.increment('evaluation', 'invalid')
+            return {
+                "valid": False,
+                "1": {"uniqueness": False, "uniqueness_issues": f"Near-duplicate of: {duplicates[0][0]}"},
+                "2": {"answer": True, "answer_issues": "Not checked"}
+            }
+        
+        return self.evaluator.evaluate_question(
+            question,
+            self._question_history(question.get('question', '')),
+            self.output_config['formats']['evaluation']
+        )
+
+    @property
+    def topic_index(self) -> TopicIndex:
+        """Local index over the concept map topics, built once per process."""
+        topics_csv = self.project_root / self.concept_map_config.get('topics_csv', 'data/concept_map/topics.csv')
+        return load_topic_index(str(topics_csv))
+
+    def _find_matching_topic_id(self, topic: str) -> str:
+        """
+        Find matching topic ID. The local topic index shortlists candidates and the LLM
+        picks among them. Matches are memoized so each topic is only resolved once.
+        """
+        with self._topic_match_lock:
+            if topic in self._topic_ids:
+                metrics.increment('topic_matching', 'cache_hits')
+                return self._topic_ids[topic]
+            topic_lock = self._topic_match_locks.setdefault(topic, threading.Lock())
+        
+        # Concurrent skills for the same topic wait for the first match instead of repeating it
+        with topic_lock:
+            if topic in self._topic_ids:
+                return self._topic_ids[topic]
             
-        except Exception as e:
-            print(f"Error finding matching topic: {str(e)}")
-            return None
+            try:
+                shortlist_size = self.concept_map_config.get('topic_shortlist_size', 15)
+                with metrics.span('topic_shortlist'):
+                    candidates = self.topic_index.search(topic, k=shortlist_size)
+                    
+                    if not candidates:
+                        # No lexical overlap, let the LLM choose from every topic
+                        candidates = self.topic_index.search_all()
+                
+                if not candidates:
+                    raise ValueError("No topics found in topic index")
+                
+                prompt = self.topic_matcher_template.format(
+                    topic_of_interest=topic,
+                    topics="\n".join(str((c.topic_name, c.topic_id)) for c in candidates)
+                )
+                
+                response = self.matching_llm.invoke(prompt)
+                topic_id = response.content.strip().strip("'\"")
+                
+                if topic_id == 'NO_MATCH':
+                    return None
+                
+                with self._topic_match_lock:
+                    self._topic_ids[topic] = topic_id
+                return topic_id
+                
+            except Exception as e:
+                print(f"Error finding matching topic: {str(e)}")
+                return None
 
     def _get_context_from_db(self, topic_id: str) -> str:
         """Get context from database using topic ID."""
         try:
-            query = f"""WITH topic_search AS 
-            (SELECT topic_id FROM topics 
-            WHERE topic_id ILIKE '{topic_id}')
-            SELECT s.subtopic_name, 
-            s.description, 
-            s.mathematical_formulation,
-            s.prerequisites,
-            s.misconceptions,
-            s.engineering_applications,
-            s.cross_cutting_topics,
-            s.analogies
-            FROM subtopics s 
-            JOIN topic_search ts 
-            ON s.topic_id = ts.topic_id 
-            ORDER BY RANDOM()
-            LIMIT 3;"""
+            with metrics.span('db_retrieval'):
+                subtopics = self.db.sample_subtopics(
+                    topic_id,
+                    k=self.concept_map_config.get('context_subtopics', 3)
+                )
             
-            return self.db.run(query)
+            if not subtopics:
+                return None
+            
+            return format_context(subtopics)
             
         except Exception as e:
             print(f"Error getting context from DB: {str(e)}")
@@ -186,11 +353,17 @@ class ConceptMapQuestionGenerator(BaseQuestionGenerator):
         max_attempts: int = 2
     ) -> Optional[Dict]:
         """Generate and validate a question with multiple attempts."""
+        num_candidates = self.concept_map_config.get('speculative_candidates', 1)
+        if num_candidates > 1:
+            return self._generate_speculatively(
+                skill, topic, output_format_generation, grade, context, num_candidates
+            )
+        
         for attempt in range(max_attempts):
             print(f"\nAttempt {attempt + 1}/{max_attempts}")
             
-            # Get question history (just the questions, not the full objects)
-            question_history = [q['question'] for q in self.generated_questions] if self.generated_questions else []
+            # Past questions most relevant to the topic (just the questions, not the full objects)
+            question_history = self._question_history(topic)
             
             try:
                 # Generate initial question
@@ -204,28 +377,21 @@ class ConceptMapQuestionGenerator(BaseQuestionGenerator):
                     output_format_generation=output_format_generation
                 )
                 
-                # Get the evaluation format from config
-                output_format_evaluation = self.output_config['formats']['evaluation']
-                
                 # Evaluate the question
-                evaluation = self.evaluator.evaluate_question(
-                    question, 
-                    question_history,
-                    output_format_evaluation
-                )
+                evaluation = self._evaluate_question(question)
                 
                 if evaluation.get("valid", False):
                     return question
                 
                 # Try fixing the question if invalid
-                fixed_question = self.fixer.fix_question(question, evaluation, question_history)
+                fixed_question = self.fixer.fix_question(
+                    question,
+                    evaluation,
+                    self._question_history(question.get('question', ''))
+                )
                 if fixed_question:
                     # Re-evaluate fixed question
-                    fixed_evaluation = self.evaluator.evaluate_question(
-                        fixed_question, 
-                        question_history,
-                        output_format_evaluation
-                    )
+                    fixed_evaluation = self._evaluate_question(fixed_question)
                     
                     if fixed_evaluation.get("valid", False):
                         return fixed_question
@@ -236,6 +402,108 @@ class ConceptMapQuestionGenerator(BaseQuestionGenerator):
         
         return None
 
+    def _generate_candidate(
+        self,
+        stop: threading.Event,
+        skill: str,
+        topic: str,
+        output_format_generation: str,
+        grade: int,
+        context: str,
+        question_history: List[str]
+    ) -> Tuple[Dict, Optional[Dict]]:
+        """
+        Generate and evaluate one candidate. stop is checked before each LLM call: a
+        candidate that has not started generating returns (None, None), and one whose
+        generation finishes after stop is set skips evaluation and returns (question, None).
+        """
+        if stop.is_set():
+            return None, None
+        
+        question = self.generator.generate_question(
+            skill=skill,
+            skill_requirement=self.skill_config['skills']['requirements'][skill],
+            topic=topic,
+            context=context,
+            question_history=question_history,
+            grade=grade,
+            output_format_generation=output_format_generation
+        )
+        
+        if stop.is_set():
+            return question, None
+        
+        return question, self._evaluate_question(question)
+
+    def _generate_speculatively(
+        self,
+        skill: str,
+        topic: str,
+        output_format_generation: str,
+        grade: int,
+        context: str,
+        num_candidates: int
+    ) -> Optional[Dict]:
+        """
+        Generate and evaluate num_candidates questions in parallel and return the first
+        one the evaluator marks valid. The fixer only runs if every candidate fails.
+        
+        Once a winner is found, queued candidates are cancelled and running ones stop at
+        their next check of the stop event. A request already in flight cannot be
+        interrupted: it finishes in the background, but its result is discarded and
+        no evaluation follows it.
+        """
+        question_history = self._question_history(topic)
+        
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=num_candidates)
+        futures = [
+            executor.submit(
+                self._generate_candidate, stop, skill, topic,
+                output_format_generation, grade, context, question_history
+            )
+            for _ in range(num_candidates)
+        ]
+        
+        failed = []
+        try:
+            for future in as_completed(futures):
+                try:
+                    question, evaluation = future.result()
+                except Exception as e:
+                    print(f"Error in candidate for {skill}: {str(e)}")
+                    continue
+                
+                if question is None:
+                    continue
+                if evaluation is not None and evaluation.get("valid", False):
+                    return question
+                failed.append((question, evaluation))
+        finally:
+            # shutdown only cancels queued futures; running candidates see stop instead
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        # Every candidate failed: try fixing the first one
+        for question, evaluation in failed:
+            if evaluation is None:
+                continue
+            try:
+                fixed_question = self.fixer.fix_question(
+                    question,
+                    evaluation,
+                    self._question_history(question.get('question', ''))
+                )
+                if fixed_question:
+                    fixed_evaluation = self._evaluate_question(fixed_question)
+                    if fixed_evaluation.get("valid", False):
+                        return fixed_question
+            except Exception as e:
+                print(f"Error fixing candidate for {skill}: {str(e)}")
+            break
+        
+        return None
+
     def generate_question(
         self,
         topic: str,
@@ -266,7 +534,7 @@ class ConceptMapQuestionGenerator(BaseQuestionGenerator):
             )
             
             if question:
-                self.generated_questions.append(question)
+                self._record_question((topic, grade, skill, self.get_method_name()), question)
                 
             return question
             
@@ -1,25 +1,18 @@
 from src.question_generators.base import BaseQuestionGenerator
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_together import ChatTogether
+from src.utils.prompt_templates import get_generation_prompt
+from src.utils.llm_client import build_llm
+from src.utils.response_parser import parse_json_response
 from typing import Dict, Optional
-import json
 
 class LLMQuestionGenerator(BaseQuestionGenerator):
     """Question generator using LLM approach."""
     
     def _initialize_components(self):
         """Initialize LLM and prompt template."""
-        self.llm = ChatTogether(
-            model=self.model_config['model'],
-            temperature=self.model_config['temperature']['generation_temperature']
-        )
+        self.llm = build_llm(self.model_config, 'generation_temperature', stage='generation')
         
         # Get method-specific prompt
-        input = self.prompt_config['prompts']['llm_prompt']
-        self.prompt_template = ChatPromptTemplate.from_messages([
-            ("system", "You are a helpful assistant. Please make sure you follow user instructions."),
-            ("human", input)
-        ])
+        self.prompt_template = get_generation_prompt(self.prompt_config, 'llm_prompt')
     
     def needs_context(self) -> bool:
         return False
@@ -42,12 +35,8 @@ class LLMQuestionGenerator(BaseQuestionGenerator):
             )
             
             response = self.llm.invoke(prompt)
-            cleaned_content = response.content.strip()
             
-            if cleaned_content.startswith("```json"):
-                cleaned_content = cleaned_content[7:-3]
-            
-            return json.loads(cleaned_content)
+            return parse_json_response(response.content, self.generation_schema)
             
         except Exception as e:
             print(f"Error generating question for {skill}: {str(e)}")
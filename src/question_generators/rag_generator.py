@@ -1,10 +1,10 @@
 from src.question_generators.base import BaseQuestionGenerator
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_together import ChatTogether
+from src.utils.prompt_templates import get_generation_prompt
+from src.utils.context_builder import build_context
+from src.utils.llm_client import build_llm
+from src.utils.metrics import metrics
+from src.utils.response_parser import parse_json_response
 from typing import Dict, Optional
-import json
-from langchain_community.vectorstores import Chroma
 import os
 
 class RAGQuestionGenerator(BaseQuestionGenerator):
@@ -12,26 +12,22 @@ class RAGQuestionGenerator(BaseQuestionGenerator):
     
     def _initialize_components(self):
         """Initialize LLM, prompt template, and retriever components."""
-        self.llm = ChatTogether(
-            model=self.model_config['model'],
-            temperature=self.model_config['temperature']['generation_temperature']
-        )
+        self.llm = build_llm(self.model_config, 'generation_temperature', stage='generation')
         
         # Get method-specific prompt that includes context
-        input = self.prompt_config['prompts']['rag_prompt']
-        self.prompt_template = ChatPromptTemplate.from_messages([
-            ("system", "You are a helpful assistant. Please make sure you follow user instructions."),
-            ("human", input)
-        ])
+        self.prompt_template = get_generation_prompt(self.prompt_config, 'rag_prompt')
         
         # Initialize retriever settings
         self.db_dir = self.model_config['vector_store']['db_dir']
         self.store_name = self.model_config['vector_store']['store_name']
         self.top_k = self.model_config['vector_store']['top_k']
+        self.fetch_k = self.model_config['vector_store'].get('fetch_k', self.top_k)
+        self.context_token_budget = self.model_config['vector_store'].get('context_token_budget', 800)
         
-        # Initialize HuggingFace embeddings
-        self.embedding_function = HuggingFaceEmbeddings(
-            model_name=self.model_config['vector_store']['embedding_model'],
+        # Shared HuggingFace embeddings, loaded on the first retrieval
+        from src.utils.embeddings import SharedEmbeddings
+        self.embedding_function = SharedEmbeddings.get(
+            self.model_config['vector_store']['embedding_model'],
             encode_kwargs={'normalize_embeddings': True}
         )
     
@@ -41,40 +37,38 @@ class RAGQuestionGenerator(BaseQuestionGenerator):
     def get_method_name(self) -> str:
         return "RAG"
     
+    def get_vector_store(self):
+        """Store searched for context; opened once per process and shared by every generator instance."""
+        # db_dir is relative to the project root unless absolute
+        persistent_directory = os.path.join(self.project_root, self.db_dir, self.store_name)
+        
+        from src.utils.vector_store import SharedVectorStore
+        return SharedVectorStore.get(persistent_directory, self.embedding_function)
+    
     def _query_vector_store(self, query: str) -> str:
         """Query the vector store to get relevant context."""
         try:
-            # Get the project root directory
-            project_root = os.getcwd()
-            persistent_directory = os.path.join(project_root, 'data', self.store_name)
-            
-            print(f"Looking for vector store in: {persistent_directory}")
-            
-            if not os.path.exists(persistent_directory):
-                print(f"Current working directory: {project_root}")
-                raise ValueError(f"Vector store directory {persistent_directory} does not exist")
-
-            db = Chroma(
-                persist_directory=persistent_directory,
-                embedding_function=self.embedding_function,
-            )
-
-            retriever = db.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": self.top_k}
-            )
+            vector_store = self.get_vector_store()
             
-            documents = retriever.invoke(query)
+            with metrics.span('vector_retrieval'):
+                documents = vector_store.search(query, self.fetch_k)
             
             if not documents:
                 print(f"Warning: No relevant documents found for query: {query}")
                 return ""
                 
-            # Combine all retrieved documents into a single context string
-            context = " ".join(doc.page_content for doc in documents)
+            # Drop overlapping/redundant chunks and fit the context into the token budget
+            context = build_context(
+                [doc.page_content for doc in documents],
+                token_budget=self.context_token_budget,
+                max_chunks=self.top_k
+            )
             
-            print(f"Retrieved context length: {len(context)} characters")
-            return context
+            print(
+                f"Retrieved context: {context.tokens} tokens from {context.chunks_used} chunks "
+                f"({context.chunks_dropped} dropped, {context.overlap_chars_trimmed} overlapping characters trimmed)"
+            )
+            return context.text
             
         except Exception as e:
             print(f"Error querying vector store: {str(e)}")
@@ -102,16 +96,8 @@ class RAGQuestionGenerator(BaseQuestionGenerator):
             
             response = self.llm.invoke(prompt)
             
-            cleaned_content = response.content.strip()
+            return parse_json_response(response.content, self.generation_schema)
             
-            if cleaned_content.startswith("```json"):
-                cleaned_content = cleaned_content[7:-3]
-            
-            question_json = json.loads(cleaned_content)
-            return question_json
-            
-        except json.JSONDecodeError as e:
-            return None
         except Exception as e:
             print(f"Error generating question for {skill}: {str(e)}")
             return None
@@ -0,0 +1,16 @@
+import importlib
+
+# Generator name -> (module, class). Modules are only imported when a generator is requested,
+# so using one method does not pay for the others' dependencies.
+GENERATORS = {
+    "LLM": ("src.question_generators.llm_generator", "LLMQuestionGenerator"),
+    "RAG": ("src.question_generators.rag_generator", "RAGQuestionGenerator"),
+    "ConceptMap": ("src.question_generators.conceptmap_generator", "ConceptMapQuestionGenerator"),
+}
+
+def load_generator_class(name: str):
+    """Import and return the generator class registered under name."""
+    if name not in GENERATORS:
+        raise ValueError(f"Unknown generator: {name}. Choose from {list(GENERATORS)}")
+    module_name, class_name = GENERATORS[name]
+    return getattr(importlib.import_module(module_name), class_name)
@@ -0,0 +1,483 @@
+"""
+Offline benchmark of the generation pipeline and TestGenerator.
+
+ChatTogether and the HuggingFace embeddings are replaced by local fakes with a fixed
+latency and canned JSON responses, so the numbers measure orchestration overhead
+(prompting, parsing, retrieval, history, I/O) and are reproducible on a machine
+without network access.
+
+    python -m src.utils.benchmark --out benchmarks/baseline.json
+    python -m src.utils.benchmark --compare benchmarks/baseline.json
+
+With --cassette the generators replay a recorded live run instead of the fake LLM,
+to profile the non-LLM stages on real responses.
+"""
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from src.question_generators.conceptmap_generator import ConceptMapQuestionGenerator
+from src.question_generators.llm_generator import LLMQuestionGenerator
+from src.question_generators.rag_generator import RAGQuestionGenerator
+from src.utils.config_loader import ConfigLoader, freeze
+from src.utils.llm_client import render_prompt, set_chat_model_factory
+from src.utils.metrics import metrics
+from src.utils.concept_map_store import load_concept_map_store
+from src.utils.topic_index import tokenize
+from contextlib import redirect_stdout
+from typing import Callable, Dict, List, Mapping, Optional
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+_TOPIC_ID_PATTERN = re.compile(r", '([^']+)'\)")
+
+class FakeLLMBackend:
+    """
+    Canned responses per pipeline stage after a fixed latency. Generated questions are
+    random word sequences so the near-duplicate checks behave as with distinct questions.
+    """
+
+    def __init__(self, latency: float = 0.05, invalid_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.invalid_rate = invalid_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.sleep_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def chat_model(self, model: str, temperature: float, stage: str) -> "FakeChatModel":
+        return FakeChatModel(self, stage)
+
+    def sleep(self, seconds: float) -> None:
+        """Sleep and count the time actually slept, overshoot included."""
+        start = time.perf_counter()
+        time.sleep(seconds)
+        slept = time.perf_counter() - start
+        with self._lock:
+            self.sleep_seconds += slept
+
+    def respond(self, stage: str, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+            words = [f"w{self.rng.randrange(100000)}" for _ in range(12)]
+            valid = self.rng.random() >= self.invalid_rate
+
+        if stage == 'topic_identification':
+            return "Newton's Laws of Motion"
+        if stage == 'topic_matching':
+            match = _TOPIC_ID_PATTERN.search(prompt)
+            return match.group(1) if match else 'NO_MATCH'
+        if stage == 'evaluation':
+            return json.dumps({
+                "valid": valid,
+                "1": {"uniqueness": valid, "uniqueness_issues": "" if valid else "Too similar"},
+                "2": {"answer": True, "answer_issues": ""}
+            })
+        # generation and fixing, wrapped like a typical model reply
+        question = {
+            "question": f"Question {number}: " + " ".join(words) + "?",
+            "skill": "",
+            "options": {"a": "alpha", "b": "beta", "c": "gamma", "d": "delta"},
+            "correct": "a",
+            "explanation": {"correct": "alpha", "a": "", "b": "", "c": "", "d": ""}
+        }
+        return "Here is the question:\n```json\n" + json.dumps(question, indent=2) + "\n```"
+
+class FakeChatModel:
+    """Drop-in for ChatTogether.invoke: sleeps, then returns an AIMessage with usage."""
+
+    def __init__(self, backend: FakeLLMBackend, stage: str):
+        self.backend = backend
+        self.stage = stage
+
+    def invoke(self, prompt) -> AIMessage:
+        rendered = render_prompt(prompt)
+        self.backend.sleep(self.backend.latency)
+        content = self.backend.respond(self.stage, rendered)
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                'input_tokens': len(rendered) // 4,
+                'output_tokens': len(content) // 4,
+                'total_tokens': (len(rendered) + len(content)) // 4
+            }
+        )
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words embeddings in place of the sentence-transformer."""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode('utf-8')).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+class FakeVectorStore:
+    """In-memory cosine search with the SharedVectorStore.search interface."""
+
+    def __init__(self, texts: List[str], embeddings: Embeddings, latency: float = 0.0):
+        self.documents = [Document(page_content=text) for text in texts]
+        self.embeddings = embeddings
+        self.matrix = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+        self.latency = latency
+        self.sleep_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def search(self, query: str, top_k: int) -> List[Document]:
+        start = time.perf_counter()
+        time.sleep(self.latency)
+        slept = time.perf_counter() - start
+        with self._lock:
+            self.sleep_seconds += slept
+        scores = self.matrix @ np.array(self.embeddings.embed_query(query), dtype=np.float32)
+        return [self.documents[index] for index in np.argsort(-scores)[:top_k]]
+
+class BenchmarkConfigLoader(ConfigLoader):
+    """
+    Project configs with overrides: no LLM cache or rate limiting, in-memory concept map,
+    temp outputs, and optionally replay from a cassette.
+    """
+
+    def __init__(self, output_dir: str, max_workers: int, cassette_path: Optional[str] = None):
+        super().__init__()
+        self.output_dir = output_dir
+        self.max_workers = max_workers
+        self.cassette_path = cassette_path
+
+    def load_model_config(self) -> Mapping:
+        config = _thaw(super().load_model_config())
+        config['llm_cache'] = {'enabled': False}
+        config['rate_limit'] = {'enabled': False}
+        config['concurrency'] = dict(config.get('concurrency') or {}, max_workers=self.max_workers)
+        config['concept_map'] = dict(config.get('concept_map') or {}, backend='memory')
+        if self.cassette_path:
+            config['llm_cassette'] = {'mode': 'replay', 'path': self.cassette_path, 'replay_fallback': 'stage'}
+        else:
+            config['llm_cassette'] = {'mode': 'off'}
+        return freeze(config)
+
+    def load_output_config(self) -> Mapping:
+        config = _thaw(super().load_output_config())
+        config['storage'] = {'output_dir': self.output_dir, 'resume': False}
+        return freeze(config)
+
+def _thaw(value):
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+def _concept_map_texts(config_loader: ConfigLoader) -> List[str]:
+    store = load_concept_map_store(str(config_loader.project_root / 'data' / 'concept_map'))
+    return [
+        f"{subtopic.subtopic_name}. {subtopic.description}"
+        for subtopic in store.subtopics.values()
+    ]
+
+def _generator_factories(store: FakeVectorStore) -> Dict[str, Callable]:
+    def rag(config_loader):
+        generator = RAGQuestionGenerator(config_loader)
+        generator.get_vector_store = lambda: store
+        return generator
+
+    return {
+        'LLM': LLMQuestionGenerator,
+        'RAG': rag,
+        'ConceptMap': ConceptMapQuestionGenerator
+    }
+
+def benchmark_generators(topics: List[str], latency: float, max_workers: int, invalid_rate: float, seed: int, cassette_path: Optional[str] = None) -> Dict[str, Dict]:
+    """Run every generator over topics and report throughput and per-question latency."""
+    results = {}
+    output_dir = tempfile.mkdtemp(prefix='mcq_benchmark_')
+    try:
+        config_loader = BenchmarkConfigLoader(output_dir, max_workers, cassette_path)
+        store = FakeVectorStore(_concept_map_texts(config_loader), FakeEmbeddings(), latency=latency / 10)
+
+        for name, factory in _generator_factories(store).items():
+            backend = FakeLLMBackend(latency=latency, invalid_rate=invalid_rate, seed=seed)
+            set_chat_model_factory(backend.chat_model)
+            metrics.reset()
+            random.seed(seed)
+            store.sleep_seconds = 0.0
+
+            generator = factory(config_loader)
+            questions = 0
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            # The pipeline prints progress for every question
+            with redirect_stdout(io.StringIO()):
+                for topic in topics:
+                    questions += len(generator.generate_all_questions(topic, grade=9, context=None)["questions"])
+            elapsed = time.perf_counter() - start
+            cpu_seconds = time.process_time() - cpu_start
+
+            latency_summary = metrics.snapshot().get(f"question.{name}", {}).get('latency', {})
+            # Per-question time not spent sleeping in the fake LLM and vector store (as measured,
+            # so sleep overshoot is excluded too), with sequential generation
+            waited = (backend.sleep_seconds + store.sleep_seconds) / max_workers
+            overhead = (elapsed - waited) / questions if questions else None
+            results[name] = {
+                'questions': questions,
+                'llm_calls': backend.calls,
+                'seconds': round(elapsed, 4),
+                'questions_per_second': round(questions / elapsed, 3) if elapsed else None,
+                'mean_question_seconds': latency_summary.get('mean_seconds'),
+                'p95_question_seconds': latency_summary.get('p95_seconds'),
+                'overhead_ms_per_question': round(overhead * 1000, 3) if overhead is not None else None,
+                'cpu_ms_per_question': round(cpu_seconds * 1000 / questions, 3) if questions else None
+            }
+    finally:
+        set_chat_model_factory(None)
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return results
+
+def make_question_pool(num_topics: int, per_topic_skill: int, seed: int, method: str) -> pd.DataFrame:
+    """Synthetic question bank with the columns TestGenerator reads."""
+    rng = random.Random(f"{seed}:{method}")
+    skills = ['Remember', 'Understand', 'Apply', 'Analyze', 'Evaluate']
+    rows = []
+    for topic_number in range(num_topics):
+        for skill in skills:
+            for question_number in range(per_topic_skill):
+                rows.append({
+                    'question': f"{method} {topic_number}-{skill}-{question_number} w{rng.randrange(10**9)}?",
+                    'skill': skill,
+                    'topic': f"Topic {topic_number}",
+                    'correct_answer': rng.choice('abcd'),
+                    'option_a': 'alpha', 'option_b': 'beta', 'option_c': 'gamma', 'option_d': 'delta'
+                })
+    return pd.DataFrame(rows)
+
+# Requests the pools cannot fill must fail within this many seconds
+IMPOSSIBLE_BATCH_SECONDS = 5.0
+
+def check_impossible_batches(work_dir: str, num_tests: int, num_topics: int, per_topic_skill: int, seed: int) -> float:
+    """
+    Time batch requests the pools cannot fill: more tests than questions per skill, and
+    single-topic pools where the methods of a test cannot use different topics. Each must
+    raise ValueError, leave the pools untouched and fail within IMPOSSIBLE_BATCH_SECONDS.
+    Returns the slowest failure in seconds.
+    """
+    from src.utils.testgeneration import TestGenerator
+
+    cases = [
+        ('over_capacity', num_topics, per_topic_skill, num_topics * per_topic_skill + 1),
+        ('single_topic', 1, num_topics * per_topic_skill, num_tests)
+    ]
+    slowest = 0.0
+    for name, topics, per_topic, requested in cases:
+        paths = []
+        for method in ('method1', 'method2', 'method3'):
+            path = os.path.join(work_dir, f'{name}_{method}.csv')
+            make_question_pool(topics, per_topic, seed, method).to_csv(path, index=False)
+            paths.append(path)
+        generator = TestGenerator(pools=paths, output_dir=os.path.join(work_dir, f'{name}_tests'))
+        
+        start = time.perf_counter()
+        try:
+            generator.assemble_tests(requested, seed=seed)
+        except ValueError:
+            pass
+        else:
+            raise RuntimeError(f"Assembling {requested} tests from the {name} pools should fail")
+        seconds = time.perf_counter() - start
+        
+        if seconds > IMPOSSIBLE_BATCH_SECONDS:
+            raise RuntimeError(f"Impossible {name} request took {seconds:.1f}s to fail")
+        if generator.used_questions or generator.tests:
+            raise RuntimeError(f"Failed {name} request left questions marked as used")
+        slowest = max(slowest, seconds)
+    return slowest
+
+def benchmark_test_generator(num_tests: int, num_topics: int, per_topic_skill: int, seed: int) -> Dict:
+    """
+    Assemble num_tests forms from synthetic pools of three methods one at a time and
+    export them, then load the pools from Arrow files and assemble the same number again
+    in batch mode.
+    """
+    from src.utils.testgeneration import TestGenerator, save_question_pool
+
+    work_dir = tempfile.mkdtemp(prefix='mcq_benchmark_tests_')
+    try:
+        paths = []
+        arrow_paths = []
+        for method in ('method1', 'method2', 'method3'):
+            pool = make_question_pool(num_topics, per_topic_skill, seed, method)
+            path = os.path.join(work_dir, f'{method}.csv')
+            pool.to_csv(path, index=False)
+            paths.append(path)
+            arrow_paths.append(os.path.join(work_dir, f'{method}.arrow'))
+            save_question_pool(pool, arrow_paths[-1])
+
+        random.seed(seed)
+        np.random.seed(seed)
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            generator = TestGenerator(pools=paths, output_dir=os.path.join(work_dir, 'tests'))
+            loaded = time.perf_counter()
+            generator.generate_all_tests(num_tests)
+            assembled = time.perf_counter()
+            generator.save_tests()
+            saved = time.perf_counter()
+
+            arrow_start = time.perf_counter()
+            batch_generator = TestGenerator(pools=arrow_paths, output_dir=os.path.join(work_dir, 'batch_tests'))
+            batch_start = time.perf_counter()
+            batch_generator.generate_all_tests(num_tests, batch=True, seed=seed)
+            batch_seconds = time.perf_counter() - batch_start
+        
+        impossible_seconds = check_impossible_batches(work_dir, num_tests, num_topics, per_topic_skill, seed)
+
+        return {
+            'pool_size': num_topics * per_topic_skill * 5 * 3,
+            'tests_requested': num_tests,
+            'tests_generated': len(generator.tests),
+            'load_seconds': round(loaded - start, 4),
+            'load_arrow_seconds': round(batch_start - arrow_start, 4),
+            'assemble_seconds': round(assembled - loaded, 4),
+            'ms_per_test': round((assembled - loaded) * 1000 / max(1, len(generator.tests)), 3),
+            'save_seconds': round(saved - assembled, 4),
+            'batch_tests_generated': len(batch_generator.tests),
+            'batch_ms_per_test': round(batch_seconds * 1000 / max(1, len(batch_generator.tests)), 3),
+            'impossible_batch_seconds': round(impossible_seconds, 4)
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def median_results(runs: List[Dict]) -> Dict:
+    """Field-wise median of repeated runs; non-numeric fields are taken from the first run."""
+    first = runs[0]
+    if isinstance(first, dict):
+        return {key: median_results([run[key] for run in runs]) for key in first}
+    if isinstance(first, (int, float)) and not isinstance(first, bool) and all(run is not None for run in runs):
+        median = float(np.median(runs))
+        return int(median) if isinstance(first, int) else round(median, 4)
+    return first
+
+def run_benchmarks(args) -> Dict:
+    config_loader = ConfigLoader()
+    topics_csv = config_loader.project_root / 'data' / 'concept_map' / 'topics.csv'
+    topics = pd.read_csv(topics_csv)['topic_name'].tolist()[:args.topics]
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'settings': {
+            'topics': len(topics),
+            'llm_latency_seconds': args.latency,
+            'max_workers': args.workers,
+            'invalid_rate': args.invalid_rate,
+            'tests': args.tests,
+            'pool_topics': args.pool_topics,
+            'pool_per_topic_skill': args.pool_per_topic_skill,
+            'seed': args.seed,
+            'cassette': args.cassette,
+            'repeats': args.repeats
+        },
+        # Medians over the repeats, so a single noisy run does not move the numbers
+        'generators': median_results([
+            benchmark_generators(topics, args.latency, args.workers, args.invalid_rate, args.seed, args.cassette)
+            for _ in range(args.repeats)
+        ]),
+        'test_generator': median_results([
+            benchmark_test_generator(args.tests, args.pool_topics, args.pool_per_topic_skill, args.seed)
+            for _ in range(args.repeats)
+        ])
+    }
+
+# Lower is better for these; everything else is reported but not checked. Each maps to the
+# smallest slowdown, in milliseconds, that counts as a regression: below it timer and
+# scheduling noise dominates, whatever the relative change
+_CHECKED_METRICS = {
+    'generators': {'overhead_ms_per_question': 2.0},
+    'test_generator': {'ms_per_test': 0.5, 'batch_ms_per_test': 0.5, 'save_seconds': 20.0, 'load_seconds': 20.0}
+}
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Regressions against the baseline: metrics slower by more than tolerance (a fraction)
+    and by more than their floor in _CHECKED_METRICS.
+    """
+    regressions = []
+    pairs = [(f"generators.{name}", result, baseline.get('generators', {}).get(name, {}), _CHECKED_METRICS['generators'])
+             for name, result in results['generators'].items()]
+    pairs.append(('test_generator', results['test_generator'], baseline.get('test_generator', {}), _CHECKED_METRICS['test_generator']))
+
+    for label, result, reference, floors in pairs:
+        for key, floor_ms in floors.items():
+            current, previous = result.get(key), reference.get(key)
+            if current is None or not previous:
+                continue
+            change = (current - previous) / previous
+            delta_ms = (current - previous) * (1000 if key.endswith('_seconds') else 1)
+            print(f"{label}.{key}: {previous} -> {current} ({change:+.0%})")
+            if change > tolerance and delta_ms > floor_ms:
+                regressions.append(f"{label}.{key}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark with fake LLM and embeddings.")
+    parser.add_argument('--topics', type=int, default=5, help="Concept map topics per generator")
+    parser.add_argument('--latency', type=float, default=0.02, help="Fake LLM latency in seconds")
+    parser.add_argument('--workers', type=int, default=1, help="concurrency.max_workers for the run")
+    parser.add_argument('--invalid-rate', type=float, default=0.0, help="Share of ConceptMap evaluations that fail")
+    parser.add_argument('--cassette', default=None, help="Replay LLM responses from this recorded cassette")
+    parser.add_argument('--tests', type=int, default=50, help="TestGenerator forms to assemble")
+    parser.add_argument('--pool-topics', type=int, default=20)
+    parser.add_argument('--pool-per-topic-skill', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeats', type=int, default=3, help="Runs per benchmark; the medians are reported")
+    parser.add_argument('--out', default=None, help="Write the results to this JSON file")
+    parser.add_argument('--compare', default=None, help="Baseline JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+    print(json.dumps(results, indent=2))
+
+    if args.out:
+        directory = os.path.dirname(args.out)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%} and the absolute floors: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
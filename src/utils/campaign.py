@@ -0,0 +1,296 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.question_generators.registry import GENERATORS, load_generator_class
+from src.utils.config_loader import ConfigLoader, resolve_project_path
+from src.utils.metrics import metrics
+from src.utils.prompt_templates import get_generation_prompt
+from src.utils.rate_limiter import set_quota_share
+
+class CampaignQueue:
+    """
+    Durable SQLite work queue of (topic, grade, generator) units.
+
+    Units move pending -> running -> done. A running unit whose lease has expired
+    is handed out again, so a crashed worker only loses the unit it was working on;
+    a unit interrupted on its last attempt is marked failed instead.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 1800, max_attempts: int = 3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS units (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                grade INTEGER NOT NULL,
+                generator TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                leased_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT,
+                UNIQUE (topic, grade, generator)
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_units_status ON units (status, id)")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def enqueue(self, units: Iterable[Tuple[str, int, str]]) -> int:
+        """Add units; units already in the queue (in any state) are left untouched."""
+        before = self.conn.total_changes
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO units (topic, grade, generator) VALUES (?, ?, ?)",
+                units
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return self.conn.total_changes - before
+
+    def requeue_running(self) -> int:
+        """
+        Return every running unit to pending, or mark it failed when its last attempt was
+        the one interrupted. Only safe when no worker is alive. Returns the units requeued.
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                """UPDATE units SET status = 'failed', worker = NULL, leased_at = NULL,
+                error = COALESCE(error, 'Interrupted on the last attempt')
+                WHERE status = 'running' AND attempts >= ?""",
+                (self.max_attempts,)
+            )
+            cursor = self.conn.execute(
+                "UPDATE units SET status = 'pending', worker = NULL, leased_at = NULL WHERE status = 'running'"
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return cursor.rowcount
+
+    def claim(self, worker_id: str) -> Optional[Tuple[int, str, int, str]]:
+        """Lease the next available unit to worker_id. Returns (id, topic, grade, generator) or None."""
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # An expired lease on the last attempt will never be claimed again
+            self.conn.execute(
+                """UPDATE units SET status = 'failed', worker = NULL, leased_at = NULL,
+                error = COALESCE(error, 'Lease expired on the last attempt')
+                WHERE status = 'running' AND leased_at < ? AND attempts >= ?""",
+                (now - self.lease_seconds, self.max_attempts)
+            )
+            row = self.conn.execute(
+                """SELECT id, topic, grade, generator FROM units
+                WHERE attempts < ?
+                AND (status = 'pending' OR (status = 'running' AND leased_at < ?))
+                ORDER BY id LIMIT 1""",
+                (self.max_attempts, now - self.lease_seconds)
+            ).fetchone()
+            if row is not None:
+                self.conn.execute(
+                    """UPDATE units SET status = 'running', worker = ?, leased_at = ?, attempts = attempts + 1
+                    WHERE id = ?""",
+                    (worker_id, now, row[0])
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def complete(self, unit_id: int, result: Dict, worker_id: str) -> bool:
+        """
+        Checkpoint a finished unit together with its generated questions. Returns False,
+        leaving the unit untouched, when worker_id no longer holds its lease.
+        """
+        cursor = self.conn.execute(
+            """UPDATE units SET status = 'done', finished_at = ?, result = ?, error = NULL
+            WHERE id = ? AND worker = ? AND status = 'running'""",
+            (time.time(), json.dumps(result, ensure_ascii=False), unit_id, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, unit_id: int, error: str, worker_id: str) -> None:
+        """
+        Release a unit after an error; it is retried until max_attempts is reached.
+        Ignored when worker_id no longer holds the lease.
+        """
+        self.conn.execute(
+            """UPDATE units SET
+            status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END,
+            worker = NULL, leased_at = NULL, error = ?
+            WHERE id = ? AND worker = ? AND status = 'running'""",
+            (self.max_attempts, error, unit_id, worker_id)
+        )
+
+    def counts(self) -> Dict[str, int]:
+        """Number of units per status."""
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+def load_topics(topics_csv: str) -> List[str]:
+    """Read topic names from the concept map topics CSV."""
+    with open(topics_csv, newline='', encoding='utf-8') as f:
+        return [row['topic_name'] for row in csv.DictReader(f) if row.get('topic_name')]
+
+def worker_metrics_path(metrics_path: str, pid: int) -> str:
+    """Per-worker metrics file, e.g. metrics.prom -> metrics.<pid>.prom."""
+    root, ext = os.path.splitext(metrics_path)
+    return f"{root}.{pid}{ext}"
+
+def run_worker(db_path: str, config_dir: Optional[str], lease_seconds: float, max_attempts: int, num_workers: int = 1, metrics_path: Optional[str] = None) -> None:
+    """
+    Pull units from the queue until it is empty. Generators are built once per worker.
+    With metrics_path, the worker's stage metrics are written next to it when it exits.
+    """
+    worker_id = f"{os.uname().nodename}:{os.getpid()}"
+    queue = CampaignQueue(db_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    config_loader = ConfigLoader(config_dir)
+    generators = {}
+
+    # Workers share the API quota
+    set_quota_share(num_workers)
+
+    try:
+        while True:
+            unit = queue.claim(worker_id)
+            if unit is None:
+                break
+
+            unit_id, topic, grade, generator_name = unit
+            print(f"[{worker_id}] {generator_name} | grade {grade} | {topic}")
+
+            try:
+                if generator_name not in generators:
+                    generators[generator_name] = load_generator_class(generator_name)(config_loader)
+                # A retried unit only regenerates the skills its earlier attempts missed
+                result = generators[generator_name].generate_all_questions(topic, grade=grade, context=None, resume=True)
+
+                if not result["questions"]:
+                    raise ValueError("No questions generated")
+                if result["missing_skills"]:
+                    raise ValueError(f"Missing skills: {', '.join(result['missing_skills'])}")
+
+                if not queue.complete(unit_id, result, worker_id):
+                    print(f"[{worker_id}] Lease on unit {unit_id} expired before it finished; result dropped")
+            except Exception as e:
+                print(f"[{worker_id}] Error on unit {unit_id}: {str(e)}")
+                queue.fail(unit_id, str(e), worker_id)
+    finally:
+        queue.close()
+        if metrics_path:
+            metrics.write(worker_metrics_path(metrics_path, os.getpid()))
+
+def run_campaign(
+    db_path: str,
+    topics: List[str],
+    grades: List[int],
+    generator_names: List[str],
+    num_workers: int = 4,
+    config_dir: Optional[str] = None,
+    lease_seconds: float = 1800,
+    max_attempts: int = 3,
+    metrics_path: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Enqueue every (topic, grade, generator) unit and process the queue with worker processes.
+    Rerunning with the same db_path resumes: finished units are never redone.
+    """
+    unknown = [name for name in generator_names if name not in GENERATORS]
+    if unknown:
+        raise ValueError(f"Unknown generators: {unknown}. Choose from {list(GENERATORS)}")
+
+    # Parse configs and compile prompt templates once; forked workers inherit them
+    config_loader = ConfigLoader(config_dir)
+    config_loader.preload()
+    for prompt_key in ('llm_prompt', 'rag_prompt'):
+        get_generation_prompt(config_loader.load_prompt_config(), prompt_key)
+
+    queue = CampaignQueue(db_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    try:
+        # Nothing is running yet, so any 'running' unit belongs to a crashed run
+        reclaimed = queue.requeue_running()
+        added = queue.enqueue(
+            (topic, grade, name)
+            for topic in topics
+            for grade in grades
+            for name in generator_names
+        )
+        print(f"Queued {added} new units, reclaimed {reclaimed} interrupted units")
+        print(f"Queue status: {queue.counts()}")
+    finally:
+        queue.close()
+
+    workers = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(db_path, config_dir, lease_seconds, max_attempts, num_workers, metrics_path)
+        )
+        for _ in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    queue = CampaignQueue(db_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    try:
+        counts = queue.counts()
+    finally:
+        queue.close()
+
+    print(f"Campaign finished: {counts}")
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate questions for every concept map topic.")
+    parser.add_argument('--db', default='campaign.sqlite', help="SQLite queue and checkpoint file")
+    parser.add_argument('--topics-csv', default=None, help="Topics to queue (default: the project's concept map)")
+    parser.add_argument('--grades', type=int, nargs='+', default=[9])
+    parser.add_argument('--generators', nargs='+', default=list(GENERATORS), choices=list(GENERATORS))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=None, help="Only queue the first N topics")
+    parser.add_argument('--config-dir', default=None)
+    parser.add_argument('--lease-seconds', type=float, default=1800)
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--metrics', default=None,
+                        help="Write per-stage metrics per worker (.prom for Prometheus text, otherwise JSON)")
+    args = parser.parse_args()
+
+    topics = load_topics(args.topics_csv or resolve_project_path(os.path.join('data', 'concept_map', 'topics.csv')))
+    if args.limit is not None:
+        topics = topics[:args.limit]
+
+    run_campaign(
+        args.db,
+        topics,
+        args.grades,
+        args.generators,
+        num_workers=args.workers,
+        config_dir=args.config_dir,
+        lease_seconds=args.lease_seconds,
+        max_attempts=args.max_attempts,
+        metrics_path=args.metrics
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from dataclasses import astuple, dataclass
+from dotenv import load_dotenv
+from typing import Any, Dict, List, Optional
+import os
+import random
+import threading
+
+@dataclass(frozen=True)
+class Topic:
+    topic_id: str
+    topic_name: str
+
+@dataclass(frozen=True)
+class Subtopic:
+    """Concept map subtopic fields used as generation context."""
+    subtopic_name: str
+    description: Optional[str]
+    mathematical_formulation: Any
+    prerequisites: Any
+    misconceptions: Any
+    engineering_applications: Any
+    cross_cutting_topics: Any
+    analogies: Any
+
+SUBTOPIC_COLUMNS = (
+    "subtopic_name, description, mathematical_formulation, prerequisites, misconceptions, "
+    "engineering_applications, cross_cutting_topics, analogies"
+)
+
+def format_context(subtopics: List[Subtopic]) -> str:
+    """Render subtopics as the row list used in the concept map generation prompt."""
+    return str([astuple(subtopic) for subtopic in subtopics])
+
+def postgres_url_from_env() -> str:
+    load_dotenv()
+    return (
+        f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@"
+        f"{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+    )
+
+def ensure_indexes(engine) -> None:
+    """Create the index used by the subtopic lookups by topic_id if it does not exist."""
+    from sqlalchemy import text
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS idx_subtopics_topic_id ON subtopics (topic_id)"))
+
+class ConceptMapRepository:
+    """
+    Data access for the concept map tables.
+
+    Uses a pooled SQLAlchemy engine and bound-parameter queries, so it is safe to share
+    between threads. Subtopics are looked up by exact topic_id through an index, and
+    random sampling picks ids in Python from the (small, cached) id list of a topic
+    instead of sorting every matching row with ORDER BY RANDOM().
+    Works against Postgres or an SQLite stand-in with the same tables.
+    """
+
+    def __init__(self, url: str, pool_size: int = 5, max_overflow: int = 10):
+        from sqlalchemy import bindparam, create_engine, text
+
+        engine_kwargs = {'pool_pre_ping': True}
+        if not url.startswith('sqlite'):
+            engine_kwargs.update(pool_size=pool_size, max_overflow=max_overflow)
+        self.engine = create_engine(url, **engine_kwargs)
+
+        self._topics_query = text("SELECT topic_id, topic_name FROM topics ORDER BY topic_id")
+        self._subtopic_ids_query = text(
+            "SELECT subtopic_id FROM subtopics WHERE topic_id = :topic_id ORDER BY subtopic_id"
+        )
+        self._subtopics_query = text(
+            f"SELECT subtopic_id, {SUBTOPIC_COLUMNS} FROM subtopics WHERE subtopic_id IN :subtopic_ids"
+        ).bindparams(bindparam('subtopic_ids', expanding=True))
+
+        self._topics: Optional[List[Topic]] = None
+        self._topic_ids_by_lower: Dict[str, str] = {}
+        self._subtopic_ids: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, pool_size: int = 5, max_overflow: int = 10) -> "ConceptMapRepository":
+        """Connect to the Postgres database configured in the DB_* environment variables."""
+        return cls(postgres_url_from_env(), pool_size=pool_size, max_overflow=max_overflow)
+
+    def ensure_indexes(self) -> None:
+        """Create the index used by the topic_id lookup if it does not exist."""
+        ensure_indexes(self.engine)
+
+    def fetch_topics(self) -> List[Topic]:
+        """All topics; cached after the first call."""
+        with self._lock:
+            if self._topics is not None:
+                return self._topics
+
+        with self.engine.connect() as conn:
+            topics = [Topic(row.topic_id, row.topic_name) for row in conn.execute(self._topics_query)]
+
+        with self._lock:
+            self._topics = topics
+            self._topic_ids_by_lower = {topic.topic_id.lower(): topic.topic_id for topic in topics}
+        return topics
+
+    def resolve_topic_id(self, topic_id: str) -> Optional[str]:
+        """Map a topic id with possibly different casing or padding to the stored id."""
+        self.fetch_topics()
+        return self._topic_ids_by_lower.get(topic_id.strip().lower())
+
+    def subtopic_ids(self, topic_id: str) -> List[str]:
+        """Ids of the subtopics of topic_id; cached per topic."""
+        with self._lock:
+            if topic_id in self._subtopic_ids:
+                return self._subtopic_ids[topic_id]
+
+        with self.engine.connect() as conn:
+            ids = [row.subtopic_id for row in conn.execute(self._subtopic_ids_query, {'topic_id': topic_id})]
+
+        with self._lock:
+            self._subtopic_ids[topic_id] = ids
+        return ids
+
+    def sample_subtopics(self, topic_id: str, k: int = 3, rng: Optional[random.Random] = None) -> List[Subtopic]:
+        """Return up to k random subtopics of topic_id."""
+        canonical_id = self.resolve_topic_id(topic_id)
+        if canonical_id is None:
+            return []
+
+        ids = self.subtopic_ids(canonical_id)
+        if not ids:
+            return []
+
+        sampled = (rng or random).sample(ids, min(k, len(ids)))
+        with self.engine.connect() as conn:
+            rows = {
+                row.subtopic_id: row
+                for row in conn.execute(self._subtopics_query, {'subtopic_ids': sampled})
+            }
+
+        return [
+            Subtopic(*tuple(rows[subtopic_id])[1:])
+            for subtopic_id in sampled
+            if subtopic_id in rows
+        ]
+
+    def close(self) -> None:
+        self.engine.dispose()
@@ -0,0 +1,154 @@
+from src.utils.concept_map_db import Subtopic, Topic
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import csv
+import io
+import json
+import os
+import pickle
+import random
+
+# Same fallbacks as the CSV -> SQL import
+ENCODINGS_TO_TRY = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
+
+# Columns stored as JSON in the database
+JSON_COLUMNS = (
+    'mathematical_formulation', 'prerequisites', 'misconceptions',
+    'engineering_applications', 'cross_cutting_topics', 'analogies'
+)
+
+CACHE_VERSION = 1
+
+def _read_csv_rows(path: str) -> List[Dict[str, str]]:
+    with open(path, 'rb') as f:
+        raw = f.read()
+    for encoding in ENCODINGS_TO_TRY:
+        try:
+            text = raw.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError(f"Could not read {path} with any of the attempted encodings")
+    return list(csv.DictReader(io.StringIO(text, newline='')))
+
+def _parse_json_cell(value: str):
+    """Parse a JSON column like the database would; unparseable cells stay text."""
+    if not value or not value.strip():
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+class InMemoryConceptMapStore:
+    """
+    Concept map held in memory, built from the data/concept_map CSVs.
+
+    Offers the same lookups as ConceptMapRepository without a database: topics and
+    subtopics are keyed by topic_id and subtopic_id for O(1) context lookups. The parsed
+    tables are pickled next to the CSVs and reloaded from there while the CSVs are
+    unchanged.
+    """
+
+    def __init__(self, topics: List[Topic], subtopics: Dict[str, Subtopic], subtopics_by_topic: Dict[str, Tuple[str, ...]]):
+        self.topics = topics
+        self.subtopics = subtopics
+        self.subtopics_by_topic = subtopics_by_topic
+        self._topic_ids_by_lower = {topic.topic_id.lower(): topic.topic_id for topic in topics}
+
+    @classmethod
+    def from_csv(cls, concept_map_dir: str) -> "InMemoryConceptMapStore":
+        """Parse topics.csv and subtopics.csv."""
+        topics = [
+            Topic(row['topic_id'], row['topic_name'])
+            for row in _read_csv_rows(os.path.join(concept_map_dir, 'topics.csv'))
+            if row.get('topic_id')
+        ]
+
+        subtopics = {}
+        subtopics_by_topic: Dict[str, List[str]] = {}
+        for row in _read_csv_rows(os.path.join(concept_map_dir, 'subtopics.csv')):
+            subtopic_id = row.get('subtopic_id')
+            if not subtopic_id:
+                continue
+            subtopics[subtopic_id] = Subtopic(
+                subtopic_name=row['subtopic_name'],
+                description=row['description'] or None,
+                **{column: _parse_json_cell(row[column]) for column in JSON_COLUMNS}
+            )
+            subtopics_by_topic.setdefault(row['topic_id'], []).append(subtopic_id)
+
+        return cls(
+            topics,
+            subtopics,
+            {topic_id: tuple(sorted(ids)) for topic_id, ids in subtopics_by_topic.items()}
+        )
+
+    @staticmethod
+    def _source_signature(concept_map_dir: str) -> Tuple:
+        signature = []
+        for filename in ('topics.csv', 'subtopics.csv'):
+            stat = os.stat(os.path.join(concept_map_dir, filename))
+            signature.append((filename, stat.st_size, stat.st_mtime_ns))
+        return (CACHE_VERSION, tuple(signature))
+
+    @classmethod
+    def load(cls, concept_map_dir: str, cache_path: Optional[str] = None) -> "InMemoryConceptMapStore":
+        """
+        Load the store from the binary cache if it matches the CSVs, otherwise parse the
+        CSVs and rewrite the cache.
+        """
+        if cache_path is None:
+            cache_path = os.path.join(concept_map_dir, '.cache', 'concept_map.pickle')
+        signature = cls._source_signature(concept_map_dir)
+
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_signature, state = pickle.load(f)
+            if cached_signature == signature:
+                return cls(*state)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+            pass
+
+        store = cls.from_csv(concept_map_dir)
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'wb') as f:
+                pickle.dump(
+                    (signature, (store.topics, store.subtopics, store.subtopics_by_topic)),
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL
+                )
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"Could not write concept map cache: {str(e)}")
+        return store
+
+    def fetch_topics(self) -> List[Topic]:
+        return self.topics
+
+    def resolve_topic_id(self, topic_id: str) -> Optional[str]:
+        return self._topic_ids_by_lower.get(topic_id.strip().lower())
+
+    def subtopic_ids(self, topic_id: str) -> List[str]:
+        return list(self.subtopics_by_topic.get(topic_id, ()))
+
+    def sample_subtopics(self, topic_id: str, k: int = 3, rng: Optional[random.Random] = None) -> List[Subtopic]:
+        """Return up to k random subtopics of topic_id."""
+        canonical_id = self.resolve_topic_id(topic_id)
+        if canonical_id is None:
+            return []
+
+        ids = self.subtopics_by_topic.get(canonical_id, ())
+        sampled = (rng or random).sample(ids, min(k, len(ids)))
+        return [self.subtopics[subtopic_id] for subtopic_id in sampled]
+
+    def close(self) -> None:
+        pass
+
+@lru_cache(maxsize=None)
+def load_concept_map_store(concept_map_dir: str) -> InMemoryConceptMapStore:
+    """Load the store for concept_map_dir once per process."""
+    return InMemoryConceptMapStore.load(concept_map_dir)
@@ -1,49 +1,95 @@
 from pathlib import Path
+import os
+from types import MappingProxyType
+import threading
 import yaml
-from typing import Dict, Optional
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+# Parsed configs shared by every ConfigLoader in the process: path -> (mtime_ns, config)
+_config_cache: Dict[Path, Tuple[int, Mapping]] = {}
+_config_cache_lock = threading.Lock()
+
+def freeze(value: Any) -> Any:
+    """Recursively turn dicts into read-only mappings and lists into tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def find_project_root() -> Path:
+    """The nearest directory above this package that holds a configs directory."""
+    current_file = Path(__file__)
+    
+    # Navigate up until we find the project root (where configs dir is)
+    project_root = current_file.parent
+    while not (project_root / 'configs').is_dir() and project_root.parent != project_root:
+        project_root = project_root.parent
+    
+    if not (project_root / 'configs').is_dir():
+        raise ValueError(f"Could not find a configs directory above {current_file}")
+    return project_root.resolve()
+
+def resolve_project_path(path: str) -> str:
+    """Absolute path for a configured path; relative ones are relative to the project root."""
+    if os.path.isabs(path):
+        return path
+    return str(find_project_root() / path)
 
 class ConfigLoader:
     """
     Load all config files
+    
+    Configs are parsed once per process and shared as read-only mappings.
+    A file is only re-parsed when its modification time changes.
     """
     
     def __init__(self, config_dir: Optional[str] = None):
 
         if config_dir is None:
-            # Start from current file location
-            current_file = Path(__file__)
-            
-            # Navigate up until we find the project root (where configs dir is)
-            project_root = current_file
-            while project_root.name != "MCQ_Distractors" and project_root.parent != project_root:
-                project_root = project_root.parent
-            
-            if project_root.name != "MCQ_Distractors":
-                raise ValueError("Could not find MCQ_Distractors directory in path")
-                
-            self.config_dir = project_root / 'configs'
+            self.config_dir = find_project_root() / 'configs'
         else:
             self.config_dir = Path(config_dir)
+        
+        self.project_root = self.config_dir.resolve().parent
 
         if not self.config_dir.exists():
             raise FileNotFoundError(f"Config directory not found at {self.config_dir}")
 
-    def load_skill_config(self) -> Dict:
+    def preload(self) -> None:
+        """Parse every config up front, e.g. before forking worker processes."""
+        self.load_skill_config()
+        self.load_model_config()
+        self.load_output_config()
+        self.load_prompt_config()
+
+    def load_skill_config(self) -> Mapping:
         return self._load_yaml('skill_config.yaml')
 
-    def load_model_config(self) -> Dict:
+    def load_model_config(self) -> Mapping:
         return self._load_yaml('model_config.yaml')
 
-    def load_output_config(self) -> Dict:
+    def load_output_config(self) -> Mapping:
         return self._load_yaml('output_config.yaml')
 
-    def load_prompt_config(self) -> Dict:
+    def load_prompt_config(self) -> Mapping:
         return self._load_yaml('prompt_config.yaml')
 
-    def _load_yaml(self, filename: str) -> Dict:
+    def _load_yaml(self, filename: str) -> Mapping:
+        path = (self.config_dir / filename).resolve()
         try:
-            with open(self.config_dir / filename, 'r') as f:
-                return yaml.safe_load(f)
+            mtime = path.stat().st_mtime_ns
+            with _config_cache_lock:
+                cached = _config_cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            
+            with open(path, 'r') as f:
+                config = freeze(yaml.safe_load(f))
+            
+            with _config_cache_lock:
+                _config_cache[path] = (mtime, config)
+            return config
         except FileNotFoundError:
             raise FileNotFoundError(
                 f"Configuration file {filename} not found in {self.config_dir}"
@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+from src.utils.near_duplicates import jaccard, shingles
+from src.utils.tokens import count_tokens
+from typing import List, Optional
+
+@dataclass
+class RetrievedContext:
+    text: str
+    tokens: int
+    chunks_used: int
+    chunks_dropped: int
+    overlap_chars_trimmed: int
+
+def _overlap_length(left: str, right: str, max_overlap: int, min_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    for length in range(min(max_overlap, len(left), len(right)), min_overlap - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text at a word boundary so that it fits in budget tokens."""
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+def build_context(
+    chunks: List[str],
+    token_budget: int,
+    max_overlap: int = 200,
+    min_overlap: int = 20,
+    redundancy_threshold: float = 0.5,
+    mmr_lambda: float = 0.7,
+    max_chunks: Optional[int] = None
+) -> RetrievedContext:
+    """
+    Assemble retrieved chunks (most relevant first) into a prompt context.
+
+    Text shared with an already selected chunk (the splitter's chunk overlap) is trimmed,
+    chunks are picked by maximal marginal relevance so near-redundant ones are dropped,
+    and the result is cut to fit token_budget. At most max_chunks chunks are kept, so
+    more chunks can be retrieved as candidates than end up in the prompt.
+    """
+    candidates = [(rank, chunk.strip(), shingles(chunk)) for rank, chunk in enumerate(chunks) if chunk and chunk.strip()]
+    total = len(candidates)
+    selected = []
+    trimmed = 0
+
+    while candidates and (max_chunks is None or len(selected) < max_chunks):
+        # Relevance from retrieval rank, penalized by similarity to what is already selected
+        best_score, best_index = None, 0
+        for index, (rank, _, chunk_shingles) in enumerate(candidates):
+            relevance = 1 - rank / max(total, 1)
+            redundancy = max((jaccard(chunk_shingles, s[2]) for s in selected), default=0.0)
+            score = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+            if best_score is None or score > best_score:
+                best_score, best_index = score, index
+
+        rank, chunk, chunk_shingles = candidates.pop(best_index)
+        if any(jaccard(chunk_shingles, s[2]) >= redundancy_threshold for s in selected):
+            continue
+
+        for _, other, _ in selected:
+            overlap = _overlap_length(other, chunk, max_overlap, min_overlap)
+            if overlap:
+                chunk = chunk[overlap:].lstrip()
+                trimmed += overlap
+            overlap = _overlap_length(chunk, other, max_overlap, min_overlap)
+            if overlap:
+                chunk = chunk[:-overlap].rstrip()
+                trimmed += overlap
+
+        if chunk:
+            selected.append((rank, chunk, chunk_shingles))
+
+    # Keep retrieval order and fill the budget
+    parts = []
+    used_tokens = 0
+    for _, chunk, _ in sorted(selected, key=lambda item: item[0]):
+        chunk_tokens = count_tokens(chunk)
+        if used_tokens + chunk_tokens <= token_budget:
+            parts.append(chunk)
+            used_tokens += chunk_tokens
+            continue
+        remainder = _truncate_to_tokens(chunk, token_budget - used_tokens)
+        if remainder:
+            parts.append(remainder)
+        break
+
+    text = " ".join(parts)
+    return RetrievedContext(
+        text=text,
+        tokens=count_tokens(text),
+        chunks_used=len(parts),
+        chunks_dropped=total - len(parts),
+        overlap_chars_trimmed=trimmed
+    )
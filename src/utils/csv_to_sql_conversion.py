@@ -1,26 +1,42 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import argparse
+import ast
+import codecs
+import io
 import os
+import time
+import warnings
+import numpy as np
 import pandas as pd
 from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
 import json
 
-load_dotenv()
+# Tried in this order on a sample of the file; latin1 decodes any byte sequence
+ENCODINGS_TO_TRY = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
 
-# Database connection parameters
-DATABASE = os.getenv('DB_NAME')
-USER = os.getenv('DB_USER')
-PASSWORD = os.getenv('DB_PASSWORD')
-HOST = os.getenv('DB_HOST')
-PORT = os.getenv('DB_PORT')
+ENCODING_SAMPLE_BYTES = 1 << 20
 
-connection_string = f"postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}"
+CHUNK_SIZE = 50000
 
-# Create a SQLAlchemy engine
-engine = create_engine(connection_string)
+MERGE_MODES = ('error', 'skip', 'update')
 
-csv_path = "path_to_csv_file"
+MAX_VALUE_LENGTH = 2500
 
-def get_table_structure(table_name):
+# Distinct cells below which JSON cleaning stays in-process; worker start-up costs more
+PARALLEL_THRESHOLD = 20000
+
+MAX_REPORTED_FAILURES = 10
+
+def get_engine(url=None):
+    """Engine for url, or for the Postgres database configured in the DB_* environment variables."""
+    if url is None:
+        from src.utils.concept_map_db import postgres_url_from_env
+        url = postgres_url_from_env()
+    return create_engine(url)
+
+def get_table_structure(engine, table_name):
     with engine.connect() as conn:
         result = conn.execute(text("""
             SELECT 
@@ -41,129 +57,359 @@ def get_table_structure(table_name):
             print(f"  {col}: {dtype}")
         return columns
     
-def check_row_lengths(df):
-    # Get length of each column's content for all rows
+def check_row_lengths(df, max_length=MAX_VALUE_LENGTH):
+    """Print the rows whose values are longer than max_length characters."""
     for col in df.columns:
-        # Convert each value to string and get its length
-        df[f'{col}_length'] = df[col].astype(str).apply(len)
-        
-        # Find rows where length > 2500
-        long_rows = df[df[f'{col}_length'] > 2500]
-        if not long_rows.empty:
-            print(f"\nColumn '{col}' has values exceeding 2500 characters in these rows:")
-            for idx, row in long_rows.iterrows():
-                print(f"Row {idx}: {row[f'{col}_length']} characters")
-                print(f"First 100 characters: {row[col][:100]}...")
+        values = df[col].astype(str)
+        lengths = values.str.len()
+        long_rows = np.flatnonzero((lengths > max_length).to_numpy())
+        if len(long_rows):
+            print(f"\nColumn '{col}' has values exceeding {max_length} characters in these rows:")
+            for idx, length, value in zip(df.index[long_rows], lengths.iloc[long_rows], values.iloc[long_rows]):
+                print(f"Row {idx}: {length} characters")
+                print(f"First 100 characters: {value[:100]}...")
                 print("-" * 80)
     
-    # Remove the temporary length columns
-    length_cols = [col for col in df.columns if col.endswith('_length')]
-    df.drop(columns=length_cols, inplace=True)
-    
     return df
 
-def process_csv_to_sql(csv_path):
-    # Get table name from CSV filename
-    table_name = os.path.splitext(os.path.basename(csv_path))[0]
-    
-    # Get table structure first
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT column_name, data_type 
-            FROM information_schema.columns 
-            WHERE table_name = :table_name
-            ORDER BY ordinal_position;
-        """), {"table_name": table_name})
-        
-        table_columns = {row[0]: row[1] for row in result}
-        print("\nTable structure:")
-        for col, dtype in table_columns.items():
-            print(f"  {col}: {dtype}")
-    
-    # Try different encodings to read CSV
-    encodings_to_try = ['utf-8', 'latin1', 'iso-8859-1', 'cp1252']
-    df = None
-    
-    for encoding in encodings_to_try:
+def detect_encoding(csv_path, sample_size=ENCODING_SAMPLE_BYTES):
+    """First of ENCODINGS_TO_TRY that decodes a sample from the start of the file."""
+    with open(csv_path, 'rb') as f:
+        sample = f.read(sample_size)
+    for encoding in ENCODINGS_TO_TRY:
         try:
-            df = pd.read_csv(csv_path, encoding=encoding)
-            print(f"\nSuccessfully read CSV with {encoding} encoding")
-            break
+            # Not final: the sample may end inside a multi-byte character
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
         except UnicodeDecodeError:
             continue
+    raise ValueError("Could not read the CSV file with any of the attempted encodings")
+
+def get_primary_key(engine, table_name):
+    with engine.connect() as conn:
+        result = conn.execute(text("""
+            SELECT a.attname
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = CAST(:table_name AS regclass) AND i.indisprimary;
+        """), {"table_name": table_name})
+        return [row[0] for row in result]
+
+def read_csv_chunks(csv_path, encoding, columns, chunk_size=CHUNK_SIZE):
+    """Stream the table's columns of the CSV as text, chunk_size rows at a time."""
+    # Values stay text: Postgres parses them into the column types during COPY
+    return pd.read_csv(
+        csv_path,
+        encoding=encoding,
+        usecols=lambda col: col in columns,
+        dtype=str,
+        chunksize=chunk_size
+    )
+
+def merge_statement(engine, table_name, columns, on_conflict):
+    quote = engine.dialect.identifier_preparer.quote
+    column_list = ", ".join(quote(col) for col in columns)
+    statement = f"INSERT INTO {quote(table_name)} ({column_list}) SELECT {column_list} FROM csv_import_staging"
+    if on_conflict == 'skip':
+        statement += " ON CONFLICT DO NOTHING"
+    elif on_conflict == 'update':
+        key = get_primary_key(engine, table_name)
+        if not key:
+            raise ValueError(f"Table {table_name} has no primary key to merge on")
+        updates = [col for col in columns if col not in key]
+        statement += f" ON CONFLICT ({', '.join(quote(col) for col in key)}) DO "
+        statement += (
+            "UPDATE SET " + ", ".join(f"{quote(col)} = EXCLUDED.{quote(col)}" for col in updates)
+            if updates else "NOTHING"
+        )
+    return statement
+
+def copy_csv(engine, csv_path, table_name, table_columns, encoding, chunk_size=CHUNK_SIZE, on_conflict='error', workers=None):
+    """
+    Load the CSV in one transaction: every chunk is COPYed into a temporary staging table
+    shaped like the target table, which is then merged into it with a single INSERT.
+    JSON columns are cleaned with up to workers processes.
+    Returns the number of rows read and the number of rows merged.
+    """
+    quote = engine.dialect.identifier_preparer.quote
+    json_columns = [col for col, dtype in table_columns.items() if dtype.lower() in ('json', 'jsonb')]
+    rows_read = 0
+    columns = None
+
+    connection = engine.raw_connection()
+    normalizer = JsonColumnNormalizer(workers)
+    try:
+        connection.set_client_encoding('UTF8')
+        cursor = connection.cursor()
+        cursor.execute(
+            f"CREATE TEMP TABLE csv_import_staging (LIKE {quote(table_name)} INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+
+        for chunk in read_csv_chunks(csv_path, encoding, table_columns, chunk_size):
+            if columns is None:
+                columns = chunk.columns.tolist()
+                print("\nLoading columns:", columns)
+                if json_columns:
+                    print(f"Processing JSON columns: {[col for col in json_columns if col in columns]}")
+
+            # Find exceeding rows before any processing
+            chunk = check_row_lengths(chunk)
+            chunk = normalizer.normalize(chunk, json_columns)
+
+            buffer = io.StringIO()
+            # Missing values are written unquoted and empty, which COPY reads as NULL
+            chunk.to_csv(buffer, header=False, index=False)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY csv_import_staging ({', '.join(quote(col) for col in columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            rows_read += len(chunk)
+            print(f"Staged {rows_read} rows")
+
+        if columns is None:
+            connection.rollback()
+            return 0, 0
+
+        normalizer.print_summary()
+
+        cursor.execute(merge_statement(engine, table_name, columns, on_conflict))
+        rows_merged = cursor.rowcount
+        connection.commit()
+        return rows_read, rows_merged
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        normalizer.close()
+        connection.close()
+
+def process_csv_to_sql(csv_path, engine=None, chunk_size=CHUNK_SIZE, on_conflict='error', workers=None):
+    """
+    Bulk load csv_path into the table named after the file. on_conflict decides what
+    happens to rows whose key already exists: 'error' aborts the load, 'skip' keeps the
+    stored rows and 'update' overwrites them. workers caps the processes used to clean
+    JSON columns (default: one per core).
+    """
+    if on_conflict not in MERGE_MODES:
+        raise ValueError(f"Unknown on_conflict mode: {on_conflict}. Choose from {MERGE_MODES}")
+    engine = engine or get_engine()
+
+    # Get table name from CSV filename
+    table_name = os.path.splitext(os.path.basename(csv_path))[0]
     
-    if df is None:
-        raise ValueError("Could not read the CSV file with any of the attempted encodings")
-    
-    print("\nCSV columns:", df.columns.tolist())
-    
-    # Find exceeding rows before any processing
-    df = check_row_lengths(df)
-    
-    # Only keep columns that exist in the table
-    valid_columns = [col for col in df.columns if col in table_columns]
-    df = df[valid_columns]
+    table_columns = get_table_structure(engine, table_name)
+    if not table_columns:
+        raise ValueError(f"Table {table_name} does not exist")
     
-    # Process JSON columns
-    json_columns = [col for col, dtype in table_columns.items() 
-                   if dtype.lower() in ('json', 'jsonb') and col in df.columns]
+    start = time.perf_counter()
+    encoding = detect_encoding(csv_path)
+    print(f"\nReading CSV with {encoding} encoding")
     
-    if json_columns:
-        print(f"\nProcessing JSON columns: {json_columns}")
-        for col in json_columns:
-            df[col] = df[col].apply(clean_json_field)
+    try:
+        rows_read, rows_merged = copy_csv(engine, csv_path, table_name, table_columns, encoding, chunk_size, on_conflict, workers)
+    except UnicodeDecodeError:
+        # The sample decoded but a later part of the file did not; latin1 reads any byte
+        print(f"CSV is not valid {encoding} past the sample, retrying with latin1")
+        rows_read, rows_merged = copy_csv(engine, csv_path, table_name, table_columns, 'latin1', chunk_size, on_conflict, workers)
     
-    # Write to database
-    df.to_sql(table_name, engine, if_exists='append', index=False)
-    print(f"Data imported successfully into the {table_name} table!")
+    print(
+        f"Data imported successfully into the {table_name} table! "
+        f"{rows_merged} of {rows_read} rows merged in {time.perf_counter() - start:.1f}s"
+    )
+
+    if table_name == 'subtopics':
+        # Subtopics are looked up by topic_id for every concept map prompt
+        from src.utils.concept_map_db import ensure_indexes
+        ensure_indexes(engine)
+        print("Ensured the subtopics topic_id index")
+
+# Cell shapes, told apart before parsing
+SHAPE_TEXT, SHAPE_LIST, SHAPE_OBJECT = 0, 1, 2
+
+# Parse outcomes, in the order they are tried
+OUTCOMES = ('json', 'literal', 'lenient_list', 'failed')
+
+def _unescape_nested(text):
+    """Unwrap the heavily escaped '[""[...]"]' export format."""
+    if text.startswith('[""[') and text.endswith('"]"]'):
+        return text[3:-3].replace('\\"', '"')
+    return text
+
+def _parse_lenient_list(text):
+    """Split a malformed list literal into its quoted items (e.g. unterminated strings)."""
+    items = text.replace('\n', ' ').strip().strip('[]').split('",')
+    return [item for item in (item.strip().strip('"').strip("'") for item in items) if item]
+
+def _clean_json_text(text, shape):
+    """Cleaned JSON text for one cell of the given shape, with its outcome and error."""
+    text = _unescape_nested(text.strip().rstrip(',').rstrip())
+    try:
+        return json.dumps(json.loads(text), ensure_ascii=False), 'json', None
+    except ValueError as e:
+        error = f"{type(e).__name__}: {e}"
+
+    if shape != SHAPE_TEXT:
+        # Python literals: single quotes, trailing commas
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                parsed = ast.literal_eval(text)
+            return json.dumps(parsed, ensure_ascii=False), 'literal', None
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            pass
+
+    if shape == SHAPE_LIST:
+        return json.dumps(_parse_lenient_list(text), ensure_ascii=False), 'lenient_list', None
+
+    return text, 'failed', error
+
+def _shape(text):
+    """Scalar version of classify_json_cells."""
+    stripped = text.strip().rstrip(',').rstrip()
+    if stripped.startswith('[') and stripped.endswith(']'):
+        return SHAPE_LIST
+    if stripped.startswith('{') and stripped.endswith('}'):
+        return SHAPE_OBJECT
+    return SHAPE_TEXT
+
+def _clean_json_batch(batch):
+    return [_clean_json_text(text, shape) for text, shape in batch]
+
+def classify_json_cells(values):
+    """Shape of every cell of a string Series: SHAPE_LIST, SHAPE_OBJECT or SHAPE_TEXT."""
+    # A stray comma after the closing bracket is left over from concatenated cells
+    stripped = values.str.strip().str.rstrip(',').str.rstrip()
+    lists = stripped.str.startswith('[') & stripped.str.endswith(']')
+    objects = stripped.str.startswith('{') & stripped.str.endswith('}')
+    shapes = np.full(len(values), SHAPE_TEXT, dtype=np.int8)
+    shapes[lists.to_numpy(dtype=bool)] = SHAPE_LIST
+    shapes[objects.to_numpy(dtype=bool)] = SHAPE_OBJECT
+    return shapes
 
 def clean_json_field(text):
+    """Clean a single JSON cell; JsonColumnNormalizer does the same for whole columns."""
+    if isinstance(text, (list, dict)):
+        return json.dumps(text, ensure_ascii=False)
+    if text is None or pd.isna(text) or not str(text).strip():
+        return None
+    return _clean_json_text(str(text), _shape(str(text)))[0]
+
+@dataclass
+class JsonColumnReport:
+    column: str
+    cells: int = 0
+    nulls: int = 0
+    outcomes: Dict[str, int] = field(default_factory=dict)
+    failures: List[Tuple[object, str, str]] = field(default_factory=list)  # (row, error, first characters)
+
+    @property
+    def failed(self) -> int:
+        return self.outcomes.get('failed', 0)
+
+    def summary(self) -> str:
+        parsed = ", ".join(f"{outcome} {self.outcomes[outcome]}" for outcome in OUTCOMES if self.outcomes.get(outcome))
+        lines = [f"  {self.column}: {self.cells} cells, {self.nulls} empty" + (f", {parsed}" if parsed else "")]
+        for row, error, preview in self.failures:
+            lines.append(f"    row {row}: {error} in {preview!r}")
+        if self.failed > len(self.failures):
+            lines.append(f"    ... {self.failed - len(self.failures)} more failed cells")
+        return "\n".join(lines)
+
+class JsonColumnNormalizer:
+    """
+    Cleans JSON columns a whole column at a time. Cells are classified by shape with
+    vectorized string checks, every distinct cell is parsed once (in a process pool for
+    large batches) and the results are mapped back onto the column. Outcomes and failing
+    rows are collected per column in reports instead of being printed cell by cell.
+    """
+
+    def __init__(self, workers: Optional[int] = None, parallel_threshold: int = PARALLEL_THRESHOLD):
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_threshold = parallel_threshold
+        self.reports: Dict[str, JsonColumnReport] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _parse(self, batch):
+        if self.workers < 2 or len(batch) < self.parallel_threshold:
+            return _clean_json_batch(batch)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        size = -(-len(batch) // (self.workers * 4))
+        results = []
+        for part in self._executor.map(_clean_json_batch, [batch[i:i + size] for i in range(0, len(batch), size)]):
+            results.extend(part)
+        return results
+
+    def normalize_column(self, values: pd.Series, column: Optional[str] = None) -> pd.Series:
+        column = column or str(values.name)
+        report = self.reports.setdefault(column, JsonColumnReport(column))
+        report.cells += len(values)
+
+        result = pd.Series(None, index=values.index, dtype=object)
+        native = values.map(lambda value: isinstance(value, (list, dict))).to_numpy(dtype=bool)
+        if native.any():
+            result[native] = values[native].map(lambda value: json.dumps(value, ensure_ascii=False))
+
+        texts = values[~native & values.notna().to_numpy()].astype(str)
+        texts = texts[texts.str.strip().ne('')]
+        report.nulls += len(values) - int(native.sum()) - len(texts)
+        if texts.empty:
+            return result
+
+        distinct = pd.Series(texts.unique(), dtype=object)
+        parsed = dict(zip(distinct, self._parse(list(zip(distinct, classify_json_cells(distinct).tolist())))))
+        result[texts.index] = texts.map(lambda text: parsed[text][0])
+
+        outcomes = texts.map(lambda text: parsed[text][1])
+        for outcome, count in outcomes.value_counts().items():
+            report.outcomes[outcome] = report.outcomes.get(outcome, 0) + int(count)
+
+        failing = texts[outcomes.eq('failed')]
+        for row, text in failing.head(max(0, MAX_REPORTED_FAILURES - len(report.failures))).items():
+            report.failures.append((row, parsed[text][2], text[:80]))
+        return result
+
+    def normalize(self, df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        """Clean the given columns of df in place and return it."""
+        for col in columns:
+            if col in df.columns:
+                df[col] = self.normalize_column(df[col], col)
+        return df
+
+    def print_summary(self) -> None:
+        if not self.reports:
+            return
+        print("\nJSON columns:")
+        for report in self.reports.values():
+            print(report.summary())
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk load CSV files into the Postgres tables named after them.")
+    parser.add_argument('csv_paths', nargs='+', help="CSV files, e.g. data/concept_map/subtopics.csv")
+    parser.add_argument('--url', help="Database URL (default: built from the DB_* environment variables)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows read and COPYed per chunk")
+    parser.add_argument('--workers', type=int, help="Processes cleaning JSON columns (default: one per core)")
+    parser.add_argument('--on-conflict', choices=MERGE_MODES, default='error', help="What to do with rows whose key already exists")
+    args = parser.parse_args()
+
+    engine = get_engine(args.url)
     try:
-        if pd.isna(text):
-            return None
-
-        # If it's already a list or dict, convert to JSON string
-        if isinstance(text, (list, dict)):
-            return json.dumps(text, ensure_ascii=False)
-            
-        # If it's a string, clean it up
-        if isinstance(text, str):
-            # Handle heavily escaped format
-            if text.startswith('[""[') and text.endswith('"]"]'):
-                text = text[3:-3]
-                text = text.replace('\\"', '"')
-            
-            # Handle LaTeX equations by preserving backslashes
-            text = text.replace('\\\\', '\\\\\\\\')  # Double the backslashes
-            text = text.replace('\n', ' ').strip()
-            text = text.replace('\\u2019', "'")
-            
-            if text.strip().startswith('[') and text.strip().endswith(']'):
-                # Clean up the list items
-                items = text.strip('[]').split('",')
-                cleaned_items = []
-                for item in items:
-                    item = item.strip().strip('"').strip("'")
-                    if item:
-                        cleaned_items.append(item)
-                return json.dumps(cleaned_items)
-            
-            try:
-                parsed = json.loads(text)
-                return json.dumps(parsed, ensure_ascii=False)
-            except:
-                # If parsing fails, try to evaluate as Python literal
-                import ast
-                try:
-                    parsed = ast.literal_eval(text)
-                    return json.dumps(parsed, ensure_ascii=False)
-                except:
-                    print(f"Failed to parse JSON: {text}")
-                    return text
-                
-    except Exception as e:
-        print(f"Error processing JSON: {e}")
-        print(f"Problematic text: {text}")
-        return '[null]'
-
-process_csv_to_sql(csv_path)
+        for csv_path in args.csv_paths:
+            process_csv_to_sql(csv_path, engine, chunk_size=args.chunk_size, on_conflict=args.on_conflict, workers=args.workers)
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
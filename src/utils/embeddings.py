@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+from typing import Dict, List, Optional, Tuple
+import threading
+
+class SharedEmbeddings(Embeddings):
+    """
+    Process-wide embedding model registry entry.
+
+    The underlying HuggingFace model is loaded once per process, on the first embedding
+    call rather than at construction, and is shared by every caller asking for the same
+    model. Query embeddings are kept in an LRU cache so repeated topics skip the encoder.
+    """
+
+    _instances: Dict[Tuple, "SharedEmbeddings"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, model_name: str, encode_kwargs: Optional[Dict] = None, cache_size: int = 1024):
+        self.model_name = model_name
+        self.encode_kwargs = dict(encode_kwargs or {})
+        self.cache_size = cache_size
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, model_name: str, encode_kwargs: Optional[Dict] = None, cache_size: int = 1024) -> "SharedEmbeddings":
+        """Return the shared embeddings for model_name and encode_kwargs."""
+        key = (model_name, tuple(sorted((encode_kwargs or {}).items())))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(model_name, encode_kwargs, cache_size)
+            return cls._instances[key]
+
+    @property
+    def model(self):
+        """The loaded embedding model, loaded on first access."""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from langchain_huggingface import HuggingFaceEmbeddings
+
+                    print(f"Loading embedding model: {self.model_name}")
+                    self._model = HuggingFaceEmbeddings(
+                        model_name=self.model_name,
+                        encode_kwargs=self.encode_kwargs
+                    )
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._cache_lock:
+            if text in self._query_cache:
+                self._query_cache.move_to_end(text)
+                return list(self._query_cache[text])
+
+        embedding = self.model.embed_query(text)
+
+        with self._cache_lock:
+            self._query_cache[text] = embedding
+            while len(self._query_cache) > self.cache_size:
+                self._query_cache.popitem(last=False)
+        return list(embedding)
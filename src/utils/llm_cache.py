@@ -0,0 +1,115 @@
+from src.utils.config_loader import resolve_project_path
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+class LLMCache:
+    """
+    Persistent content-addressed cache of LLM responses.
+
+    Entries are keyed by a hash of (model, temperature, rendered prompt) and stored in
+    SQLite so they survive reruns and are shared between worker processes. Entries older
+    than max_age_days are ignored and purged; beyond max_entries the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: Optional[int] = 50000, max_age_days: Optional[float] = 30):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 86400 if max_age_days else None
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                temperature REAL NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)")
+        self.evict()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str) -> str:
+        payload = json.dumps([model, float(temperature), prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, model: str, temperature: float, prompt: str) -> Optional[str]:
+        """Return the cached response content, or None on a miss."""
+        key = self.make_key(model, temperature, prompt)
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.max_age_seconds is not None and now - row[1] > self.max_age_seconds:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, model: str, temperature: float, prompt: str, content: str) -> None:
+        key = self.make_key(model, temperature, prompt)
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                """INSERT OR REPLACE INTO responses (key, model, temperature, content, created_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                (key, model, float(temperature), content, now, now)
+            )
+            self._puts_since_evict += 1
+            evict_now = self._puts_since_evict >= 100
+        if evict_now:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop expired entries and trim the cache to max_entries."""
+        with self._lock:
+            self._puts_since_evict = 0
+            if self.max_age_seconds is not None:
+                self.conn.execute(
+                    "DELETE FROM responses WHERE created_at < ?",
+                    (time.time() - self.max_age_seconds,)
+                )
+            if self.max_entries is not None:
+                self.conn.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,)
+                )
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM responses")
+
+_caches: Dict[str, LLMCache] = {}
+_caches_lock = threading.Lock()
+
+def get_llm_cache(cache_config: Dict) -> LLMCache:
+    """Return the process-wide cache for the configured path, opening it on first use."""
+    path = resolve_project_path(cache_config.get('path', os.path.join('data', 'llm_cache.sqlite')))
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = LLMCache(
+                path,
+                max_entries=cache_config.get('max_entries', 50000),
+                max_age_days=cache_config.get('max_age_days', 30)
+            )
+        return _caches[path]
@@ -0,0 +1,124 @@
+from src.utils.config_loader import resolve_project_path
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+MODES = ('off', 'record', 'replay')
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when no recorded response matches a call."""
+
+class LLMCassette:
+    """
+    Recorded LLM interactions in a JSONL file.
+
+    In record mode every prompt/response pair of every stage is appended as it happens.
+    In replay mode responses are served from the file without calling the model: an exact
+    (model, temperature, stage, prompt) match is used first, in recorded order when the
+    same prompt was recorded several times. With fallback 'stage', a prompt that was never
+    recorded (e.g. a different random context sample) gets the next response recorded for
+    its stage instead, so runs keep the shape of the recorded traffic.
+    """
+
+    def __init__(self, path: str, mode: str, fallback: str = 'stage'):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}. Choose from {MODES}")
+        if fallback not in ('stage', 'error'):
+            raise ValueError(f"Unknown cassette fallback: {fallback}")
+        self.path = path
+        self.mode = mode
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, List[Dict]] = defaultdict(list)
+        self._by_stage: Dict[str, List[Dict]] = defaultdict(list)
+        self._key_positions: Dict[str, int] = defaultdict(int)
+        self._stage_positions: Dict[str, int] = defaultdict(int)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if mode == 'replay':
+            self._load()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, stage: str, prompt: str) -> str:
+        payload = json.dumps([model, float(temperature), stage, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette {self.path} not found; record one with mode: record first")
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Partially written line from an interrupted recording
+                    continue
+                self._by_key[entry['key']].append(entry)
+                self._by_stage[entry['stage']].append(entry)
+        print(f"Loaded {sum(len(entries) for entries in self._by_key.values())} recorded LLM calls from {self.path}")
+
+    def record(self, model: str, temperature: float, stage: str, prompt: str, content: str, usage: Optional[Dict] = None) -> None:
+        entry = {
+            'key': self.make_key(model, temperature, stage, prompt),
+            'model': model,
+            'temperature': temperature,
+            'stage': stage,
+            'prompt': prompt,
+            'content': content,
+            'usage': usage,
+            'recorded_at': time.time()
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+
+    def replay(self, model: str, temperature: float, stage: str, prompt: str) -> Dict:
+        """Recorded entry for the call; repeated calls cycle through the recordings."""
+        key = self.make_key(model, temperature, stage, prompt)
+        with self._lock:
+            entries = self._by_key.get(key)
+            if entries:
+                position = self._key_positions[key]
+                self._key_positions[key] = position + 1
+                return dict(entries[position % len(entries)], exact=True)
+
+            entries = self._by_stage.get(stage)
+            if self.fallback == 'stage' and entries:
+                position = self._stage_positions[stage]
+                self._stage_positions[stage] = position + 1
+                return dict(entries[position % len(entries)], exact=False)
+
+        raise CassetteMiss(f"No recorded response for stage {stage} in {self.path}")
+
+_cassettes: Dict[tuple, LLMCassette] = {}
+_cassettes_lock = threading.Lock()
+
+def get_llm_cassette(cassette_config: Dict) -> Optional[LLMCassette]:
+    """
+    Process-wide cassette for the config, or None when record/replay is off.
+    LLM_CASSETTE_MODE and LLM_CASSETTE_PATH override the config, e.g. for a single run.
+    """
+    mode = os.environ.get('LLM_CASSETTE_MODE') or cassette_config.get('mode') or 'off'
+    # YAML reads a bare off as False
+    if mode is False or mode == 'off':
+        return None
+
+    # A path from the environment is relative to the working directory, a configured one to the project root
+    if os.environ.get('LLM_CASSETTE_PATH'):
+        path = os.path.abspath(os.environ['LLM_CASSETTE_PATH'])
+    else:
+        path = resolve_project_path(cassette_config.get('path', os.path.join('data', 'llm_cassette.jsonl')))
+    fallback = cassette_config.get('replay_fallback', 'stage')
+    key = (path, mode, fallback)
+    with _cassettes_lock:
+        if key not in _cassettes:
+            _cassettes[key] = LLMCassette(path, mode, fallback)
+        return _cassettes[key]
@@ -0,0 +1,146 @@
+from typing import Callable, Dict, Optional
+import threading
+from src.utils.llm_cache import LLMCache, get_llm_cache
+from src.utils.llm_cassette import LLMCassette, get_llm_cassette
+from src.utils.metrics import metrics
+from src.utils.rate_limiter import RateLimiter, get_rate_limiter
+from src.utils.startup_timer import startup_timer
+from src.utils.tokens import count_tokens, usage_from_response
+
+# Builds the chat model behind every LLMClient from (model, temperature, stage).
+# None means ChatTogether; the offline benchmark installs local fakes.
+_chat_model_factory: Optional[Callable] = None
+
+def set_chat_model_factory(factory: Optional[Callable]) -> None:
+    """Replace the chat model used by LLMClients that have not made a call yet."""
+    global _chat_model_factory
+    _chat_model_factory = factory
+
+def render_prompt(prompt) -> str:
+    """Render a prompt (string or list of chat messages) to the text used as cache key."""
+    if isinstance(prompt, str):
+        return prompt
+    if hasattr(prompt, 'to_messages'):
+        prompt = prompt.to_messages()
+    return "\n".join(f"{message.type}: {message.content}" for message in prompt)
+
+class LLMClient:
+    """
+    Thin wrapper around a chat model used by every LLM stage of the pipeline.
+    Serves responses from the shared LLMCache when caching is enabled for the stage.
+    The Together client is only imported and built on the first call.
+    Network calls go through the process-wide RateLimiter when one is configured.
+    Latency, tokens, retries and cache hits are recorded per stage in metrics.
+    With a cassette, calls are recorded to it or replayed from it without the model.
+    """
+
+    def __init__(self, model: str, temperature: float, stage: str, cache: Optional[LLMCache] = None, llm=None, rate_limiter: Optional[RateLimiter] = None, cassette: Optional[LLMCassette] = None):
+        self.model = model
+        self.temperature = temperature
+        self.stage = stage
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.cassette = cassette
+        self._llm = llm
+        self._llm_lock = threading.Lock()
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    with startup_timer.measure(f"lazy:llm_client:{self.stage}"):
+                        if _chat_model_factory is not None:
+                            self._llm = _chat_model_factory(self.model, self.temperature, self.stage)
+                        else:
+                            from langchain_together import ChatTogether
+                            if self.rate_limiter is not None:
+                                # The limiter owns retries and backoff; client retries would multiply them
+                                self._llm = ChatTogether(model=self.model, temperature=self.temperature, max_retries=0)
+                            else:
+                                self._llm = ChatTogether(model=self.model, temperature=self.temperature)
+        return self._llm
+
+    def invoke(self, prompt):
+        rendered = render_prompt(prompt)
+
+        if self.cassette is not None and self.cassette.mode == 'replay':
+            return self._replay(rendered)
+
+        if self.cache is not None:
+            content = self.cache.get(self.model, self.temperature, rendered)
+            if content is not None:
+                from langchain_core.messages import AIMessage
+                metrics.increment(self.stage, 'cache_hits')
+                if self.cassette is not None:
+                    self.cassette.record(self.model, self.temperature, self.stage, rendered, content)
+                return AIMessage(content=content)
+
+        with metrics.span(self.stage):
+            if self.rate_limiter is not None:
+                response = self.rate_limiter.call(
+                    lambda: self.llm.invoke(prompt),
+                    estimated_tokens=count_tokens(rendered),
+                    on_retry=lambda: metrics.increment(self.stage, 'retries')
+                )
+            else:
+                response = self.llm.invoke(prompt)
+
+        usage = usage_from_response(response)
+        if usage is None:
+            # Provider did not report usage, fall back to local counts
+            usage = {
+                'prompt_tokens': count_tokens(rendered),
+                'completion_tokens': count_tokens(response.content)
+            }
+        metrics.increment(self.stage, 'calls')
+        metrics.increment(self.stage, 'prompt_tokens', usage['prompt_tokens'])
+        metrics.increment(self.stage, 'completion_tokens', usage['completion_tokens'])
+        if self.rate_limiter is not None:
+            self.rate_limiter.record_tokens(usage['completion_tokens'])
+
+        if self.cache is not None:
+            self.cache.put(self.model, self.temperature, rendered, response.content)
+        if self.cassette is not None:
+            self.cassette.record(self.model, self.temperature, self.stage, rendered, response.content, usage)
+
+        return response
+
+    def _replay(self, rendered: str):
+        """Serve the call from the cassette, with the recorded token usage."""
+        from langchain_core.messages import AIMessage
+        entry = self.cassette.replay(self.model, self.temperature, self.stage, rendered)
+        usage = entry.get('usage') or {'prompt_tokens': 0, 'completion_tokens': 0}
+        metrics.increment(self.stage, 'replayed')
+        metrics.increment(self.stage, 'prompt_tokens', usage['prompt_tokens'])
+        metrics.increment(self.stage, 'completion_tokens', usage['completion_tokens'])
+        if not entry['exact']:
+            metrics.increment(self.stage, 'replay_fallbacks')
+        return AIMessage(content=entry['content'])
+
+def build_llm(model_config: Dict, temperature_key: str, stage: str) -> LLMClient:
+    """
+    Create the LLM client for one pipeline stage.
+
+    Args:
+        model_config: Loaded model config
+        temperature_key: Key under model_config['temperature'] to use
+        stage: Stage name, e.g. 'generation', 'evaluation', 'topic_matching'
+
+    Deterministic stages (temperature 0) are cached by default; other stages only
+    when listed in llm_cache.opt_in_stages. llm_cassette.mode record/replay (or the
+    LLM_CASSETTE_MODE environment variable) records or replays every call.
+    """
+    model = model_config['model']
+    temperature = model_config['temperature'][temperature_key]
+
+    cache_config = model_config.get('llm_cache') or {}
+    cache = None
+    if cache_config.get('enabled', False):
+        if temperature == 0 or stage in (cache_config.get('opt_in_stages') or []):
+            cache = get_llm_cache(cache_config)
+
+    rate_limiter = get_rate_limiter(model_config.get('rate_limit') or {})
+    cassette = get_llm_cassette(model_config.get('llm_cassette') or {})
+
+    return LLMClient(model, temperature, stage, cache, rate_limiter=rate_limiter, cassette=cassette)
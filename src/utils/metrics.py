@@ -0,0 +1,151 @@
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+import bisect
+import json
+import os
+import threading
+import time
+
+# Latency bucket upper bounds in seconds, from local lookups to slow LLM calls
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """Cumulative-style latency histogram with fixed bucket bounds."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (max for the +Inf bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum_seconds': round(self.sum, 6),
+            'mean_seconds': round(self.sum / self.count, 6) if self.count else None,
+            'max_seconds': round(self.max, 6),
+            'p50_seconds': self.quantile(0.5),
+            'p95_seconds': self.quantile(0.95),
+            'p99_seconds': self.quantile(0.99),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('+Inf',), self.counts)}
+        }
+
+class PipelineMetrics:
+    """
+    Process-wide latency histograms and counters per pipeline stage.
+
+    Stages are e.g. topic_identification, topic_matching, vector_retrieval, db_retrieval,
+    generation, evaluation, fixing and json_parsing. Counters hold tokens, retries, cache
+    hits, errors and valid/invalid outcomes; the export adds a validity rate per stage.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.latencies: Dict[str, Histogram] = {}
+        self.counters: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.latencies.get(stage)
+            if histogram is None:
+                histogram = self.latencies[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, stage: str, name: str, amount: int = 1) -> None:
+        with self._lock:
+            counters = self.counters.setdefault(stage, {})
+            counters[name] = counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the block as one observation of stage; exceptions are counted as errors."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.increment(stage, 'errors')
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.latencies.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            stages = sorted(set(self.latencies) | set(self.counters))
+            result = {}
+            for stage in stages:
+                counters = dict(self.counters.get(stage, {}))
+                entry = {'counters': counters}
+                if stage in self.latencies:
+                    entry['latency'] = self.latencies[stage].summary()
+                judged = counters.get('valid', 0) + counters.get('invalid', 0)
+                if judged:
+                    entry['validity_rate'] = round(counters.get('valid', 0) / judged, 4)
+                result[stage] = entry
+            return result
+
+    def to_json(self) -> str:
+        return json.dumps({'generated_at': time.time(), 'stages': self.snapshot()}, indent=2)
+
+    def to_prometheus(self, prefix: str = 'mcq_pipeline') -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_stage_latency_seconds Latency of pipeline stages.",
+            f"# TYPE {prefix}_stage_latency_seconds histogram"
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self.latencies.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            lines.append(f"# HELP {prefix}_stage_events_total Counters of pipeline stages (tokens, retries, cache hits, outcomes).")
+            lines.append(f"# TYPE {prefix}_stage_events_total counter")
+            for stage, counters in sorted(self.counters.items()):
+                for name, value in sorted(counters.items()):
+                    lines.append(f'{prefix}_stage_events_total{{stage="{stage}",event="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """
+        Write the metrics to path, atomically. Files ending in .prom are written in the
+        Prometheus text format (for the node_exporter textfile collector), others as JSON.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        content = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+# Shared by every stage of the pipeline
+metrics = PipelineMetrics()
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from src.utils.topic_index import tokenize
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+import random
+import threading
+import zlib
+
+_PRIME = (1 << 61) - 1
+
+def shingles(text: str) -> FrozenSet[str]:
+    """Word unigrams and bigrams of the normalized text."""
+    tokens = tokenize(text)
+    return frozenset(tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])])
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of question texts for local near-duplicate checks.
+
+    Candidates are found through LSH buckets (bands x rows of a MinHash signature) and
+    confirmed by exact Jaccard similarity of the shingle sets, so lookups stay cheap as the
+    history grows. With max_entries set, the oldest entries are evicted once the index is
+    full. Thread-safe.
+    """
+
+    def __init__(self, num_bands: int = 16, rows_per_band: int = 4, seed: int = 7, max_entries: Optional[int] = None):
+        self.num_bands = num_bands
+        self.rows_per_band = rows_per_band
+        self.max_entries = max_entries
+        rng = random.Random(seed)
+        self._hash_params = [
+            (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME))
+            for _ in range(num_bands * rows_per_band)
+        ]
+        self._entries: "OrderedDict[int, Tuple[str, FrozenSet[str], List[Tuple[int, ...]]]]" = OrderedDict()
+        self._buckets: List[Dict[Tuple[int, ...], Set[int]]] = [{} for _ in range(num_bands)]
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, shingle_set: FrozenSet[str]) -> List[Tuple[int, ...]]:
+        hashed = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingle_set]
+        signature = [min((a * value + b) % _PRIME for value in hashed) for a, b in self._hash_params]
+        return [
+            tuple(signature[band * self.rows_per_band:(band + 1) * self.rows_per_band])
+            for band in range(self.num_bands)
+        ]
+
+    def add(self, text: str) -> int:
+        """Index text and return its entry id."""
+        shingle_set = shingles(text)
+        band_keys = self._band_keys(shingle_set) if shingle_set else []
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (text, shingle_set, band_keys)
+            for band, key in enumerate(band_keys):
+                self._buckets[band].setdefault(key, set()).add(entry_id)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._remove_locked(next(iter(self._entries)))
+        return entry_id
+
+    def remove(self, entry_id: int) -> None:
+        with self._lock:
+            self._remove_locked(entry_id)
+
+    def _remove_locked(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for band, key in enumerate(entry[2]):
+            bucket = self._buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def _candidates(self, shingle_set: FrozenSet[str]) -> List[Tuple[float, int, str]]:
+        """(similarity, entry id, text) of LSH candidates, most similar first."""
+        if not shingle_set:
+            return []
+        band_keys = self._band_keys(shingle_set)
+        with self._lock:
+            candidate_ids = set()
+            for band, key in enumerate(band_keys):
+                candidate_ids.update(self._buckets[band].get(key, ()))
+            entries = [(entry_id, self._entries[entry_id]) for entry_id in candidate_ids if entry_id in self._entries]
+        scored = [(jaccard(shingle_set, entry_shingles), entry_id, text) for entry_id, (text, entry_shingles, _) in entries]
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+        return scored
+
+    def find_duplicates(self, text: str, threshold: float = 0.6) -> List[Tuple[str, float]]:
+        """Indexed texts whose Jaccard similarity to text is at least threshold."""
+        return [
+            (candidate, similarity)
+            for similarity, _, candidate in self._candidates(shingles(text))
+            if similarity >= threshold
+        ]
+
+    def most_similar(self, text: str, k: int = 5) -> List[str]:
+        """
+        Up to k indexed texts relevant to text: the closest overlapping entries first,
+        then the most recent ones. Scans the history when LSH finds too few candidates,
+        which is cheap for short queries such as a topic name.
+        """
+        if k <= 0:
+            return []
+        shingle_set = shingles(text)
+        selected = [entry_id for _, entry_id, _ in self._candidates(shingle_set)][:k]
+
+        with self._lock:
+            if len(selected) < k and shingle_set:
+                overlapping = [
+                    (jaccard(shingle_set, entry_shingles), entry_id)
+                    for entry_id, (_, entry_shingles, _) in self._entries.items()
+                    if entry_id not in selected and not shingle_set.isdisjoint(entry_shingles)
+                ]
+                overlapping.sort(key=lambda item: (-item[0], -item[1]))
+                selected += [entry_id for _, entry_id in overlapping[:k - len(selected)]]
+
+            for entry_id in reversed(self._entries):
+                if len(selected) >= k:
+                    break
+                if entry_id not in selected:
+                    selected.append(entry_id)
+
+            return [self._entries[entry_id][0] for entry_id in selected if entry_id in self._entries]
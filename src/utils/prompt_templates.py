@@ -0,0 +1,23 @@
+from functools import lru_cache
+from typing import Mapping, Tuple
+
+DEFAULT_SYSTEM_MESSAGE = "You are a helpful assistant. Please make sure you follow user instructions."
+
+@lru_cache(maxsize=None)
+def compile_chat_prompt(messages: Tuple[Tuple[str, str], ...]):
+    """
+    Build a ChatPromptTemplate once per distinct message list.
+    
+    The cache is keyed by the prompt text itself, so an edited prompt file compiles a
+    new template while unchanged prompts are shared by every instance (and inherited
+    by forked worker processes).
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages(list(messages))
+
+def get_generation_prompt(prompt_config: Mapping, prompt_key: str):
+    """Compiled system + human template for a generation prompt in prompt_config.yaml."""
+    return compile_chat_prompt((
+        ("system", DEFAULT_SYSTEM_MESSAGE),
+        ("human", prompt_config['prompts'][prompt_key])
+    ))
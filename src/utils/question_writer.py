@@ -0,0 +1,124 @@
+from typing import Dict, Optional, Tuple
+import json
+import os
+import threading
+import time
+
+RecordKey = Tuple[str, int, str, str]
+
+class JSONLQuestionWriter:
+    """
+    Appends generated questions to a JSONL file as soon as they are produced.
+
+    Each record is written with a single append and flushed to disk, so a crash loses at
+    most the line being written; a torn last line is ignored when the file is read back.
+    Records are keyed by (topic, grade, skill, method) for resuming. The resume index is
+    kept in memory and only the lines appended since the last lookup are read, by this or
+    any other process writing the same file. A discarded record is superseded by a
+    tombstone line with the same key.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: Dict[RecordKey, Dict] = {}
+        self._offset = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def record_key(record: Dict) -> RecordKey:
+        return (record['topic'], record['grade'], record['skill'], record['method'])
+
+    def write(self, record: Dict) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def discard(self, key: RecordKey) -> None:
+        """Supersede the record for key, e.g. a question rejected after it was written."""
+        topic, grade, skill, method = key
+        self.write({
+            "topic": topic,
+            "grade": grade,
+            "skill": skill,
+            "method": method,
+            "discarded": True,
+            "created_at": time.time()
+        })
+
+    def _refresh(self) -> None:
+        """Index the complete lines appended since the last read. Call with the lock held."""
+        if not os.path.exists(self.path):
+            return
+        if os.path.getsize(self.path) < self._offset:
+            # File replaced or truncated: index it again
+            self._records = {}
+            self._offset = 0
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Partially written line from an interrupted run
+                continue
+            if record.get('discarded'):
+                self._records.pop(self.record_key(record), None)
+            else:
+                self._records[self.record_key(record)] = record
+        # An incomplete last line is read again once it is finished
+        self._offset += end
+
+    def get_record(self, key: RecordKey) -> Optional[Dict]:
+        """Latest record for key, or None."""
+        with self._lock:
+            self._refresh()
+            return self._records.get(key)
+
+    def existing_records(self) -> Dict[RecordKey, Dict]:
+        """Records already in the file, latest one per key."""
+        with self._lock:
+            self._refresh()
+            return dict(self._records)
+
+_writers: Dict[str, JSONLQuestionWriter] = {}
+_writers_lock = threading.Lock()
+
+def get_question_writer(path: str) -> JSONLQuestionWriter:
+    """Writer for path shared by every generator and thread in the process."""
+    path = os.path.abspath(path)
+    with _writers_lock:
+        if path not in _writers:
+            _writers[path] = JSONLQuestionWriter(path)
+        return _writers[path]
+
+def make_record(question: Dict, topic: str, grade: int, skill: str, method: str, model: str) -> Dict:
+    return {
+        "topic": topic,
+        "grade": grade,
+        "skill": skill,
+        "method": method,
+        "model": model,
+        "created_at": time.time(),
+        "question": question
+    }
+
+def write_json_atomic(path: str, data: Dict) -> None:
+    """Write a JSON file through a temporary file so readers never see a partial file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
@@ -0,0 +1,183 @@
+from typing import Callable, Dict, Optional, TypeVar
+import random
+import threading
+import time
+
+T = TypeVar('T')
+
+class TokenBucket:
+    """Token bucket refilled continuously at capacity per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1.0) -> None:
+        """Block until amount can be taken. Requests larger than the bucket wait for a full bucket."""
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                wait = (amount - self.available) / self.rate
+            time.sleep(min(wait, 1.0))
+
+    def debit(self, amount: float) -> None:
+        """Take amount without waiting (e.g. tokens only known after the call); may go negative."""
+        with self._lock:
+            self._refill()
+            self.available -= amount
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit: grows by one slot per limit successful calls and is cut by
+    decrease_factor whenever the provider signals overload (429s, timeouts).
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16, decrease_factor: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self) -> None:
+        with self._condition:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def on_overload(self) -> None:
+        with self._condition:
+            self.limit = max(self.minimum, self.limit * self.decrease_factor)
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limiting, timeouts and transient server errors."""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__.lower()
+    message = str(error).lower()
+    return (
+        'timeout' in name or 'ratelimit' in name or 'connection' in name
+        or '429' in message or 'rate limit' in message or 'timed out' in message
+    )
+
+class RateLimiter:
+    """
+    Coordinates every LLM call of a process: requests and tokens per minute, adaptive
+    concurrency, and retries with jittered exponential backoff on retryable errors.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 600,
+        tokens_per_minute: float = 180000,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrencyLimiter(initial_concurrency, min_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def call(self, fn: Callable[[], T], estimated_tokens: int = 0, on_retry: Optional[Callable[[], None]] = None) -> T:
+        """
+        Run fn under the limits, retrying retryable errors up to max_retries times.
+        on_retry is called before each retry, e.g. to count retries per stage.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire(1)
+            self.tokens.acquire(estimated_tokens)
+            self.concurrency.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise
+                self.concurrency.on_overload()
+                with self._lock:
+                    self.retries += 1
+                if on_retry is not None:
+                    on_retry()
+                # Full jitter: uniform over [0, capped exponential delay]
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                print(f"Retryable LLM error ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            finally:
+                self.concurrency.release()
+
+            self.concurrency.on_success()
+            return result
+
+    def record_tokens(self, tokens: int) -> None:
+        """Charge tokens that were only known after the call, e.g. completion tokens."""
+        if tokens:
+            self.tokens.debit(tokens)
+
+_limiters: Dict[tuple, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+_quota_share = 1
+
+def set_quota_share(processes: int) -> None:
+    """
+    Split the configured per-minute limits between this many processes, e.g. campaign
+    workers sharing one API key. Call before the first LLM call of the process.
+    """
+    global _quota_share
+    _quota_share = max(1, int(processes))
+
+def get_rate_limiter(rate_limit_config: Dict) -> Optional[RateLimiter]:
+    """Process-wide limiter for the config, or None when rate limiting is disabled."""
+    if not rate_limit_config.get('enabled', False):
+        return None
+
+    key = (tuple(sorted(rate_limit_config.items())), _quota_share)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(
+                requests_per_minute=rate_limit_config.get('requests_per_minute', 600) / _quota_share,
+                tokens_per_minute=rate_limit_config.get('tokens_per_minute', 180000) / _quota_share,
+                initial_concurrency=rate_limit_config.get('initial_concurrency', 4),
+                min_concurrency=rate_limit_config.get('min_concurrency', 1),
+                max_concurrency=rate_limit_config.get('max_concurrency', 16),
+                max_retries=rate_limit_config.get('max_retries', 5),
+                base_delay=rate_limit_config.get('base_delay', 1.0),
+                max_delay=rate_limit_config.get('max_delay', 30.0)
+            )
+        return _limiters[key]
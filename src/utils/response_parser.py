@@ -0,0 +1,133 @@
+from functools import lru_cache
+from typing import Any, Dict, Mapping, Optional
+import ast
+import json
+import re
+from src.utils.metrics import metrics
+
+_FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)```", re.DOTALL)
+_TRAILING_COMMA_PATTERN = re.compile(r",(\s*[}\]])")
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+class ResponseParseError(ValueError):
+    """Raised when an LLM response cannot be turned into the expected JSON."""
+
+def _record_outcome(outcome: str) -> None:
+    """Count a parse outcome (ok, repaired, failed or invalid) in metrics."""
+    metrics.increment('json_parsing', f"outcome_{outcome}")
+    metrics.increment('json_parsing', 'valid' if outcome in ('ok', 'repaired') else 'invalid')
+
+def _extract_json_text(text: str) -> str:
+    """Return the JSON object or array in text, ignoring fences and surrounding prose."""
+    fenced = _FENCE_PATTERN.search(text)
+    if fenced:
+        text = fenced.group(1)
+
+    starts = [index for index in (text.find('{'), text.find('[')) if index != -1]
+    if not starts:
+        return text.strip()
+    start = min(starts)
+
+    # Scan to the matching closing bracket, skipping brackets inside strings
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:].strip()
+
+def _replace_outside_strings(text: str, replace) -> str:
+    """Apply replace() to the parts of text that are outside double-quoted strings."""
+    parts = re.split(r'("(?:[^"\\]|\\.)*")', text)
+    return "".join(part if index % 2 else replace(part) for index, part in enumerate(parts))
+
+def _repair(text: str) -> str:
+    def fix(segment: str) -> str:
+        segment = _TRAILING_COMMA_PATTERN.sub(r"\1", segment)
+        return re.sub(r"\b(True|False|None)\b", lambda match: _PYTHON_LITERALS[match.group(1)], segment)
+    return _replace_outside_strings(text, fix)
+
+def _loads(text: str) -> Any:
+    return json.loads(text, strict=False)
+
+def _missing_keys(data: Any, schema: Mapping) -> list:
+    """Top-level schema keys missing from data, or nested objects with the wrong type."""
+    if not isinstance(data, dict):
+        return ['<object>']
+    missing = []
+    for key, expected in schema.items():
+        if key not in data:
+            missing.append(key)
+        elif isinstance(expected, Mapping) and not isinstance(data[key], dict):
+            missing.append(key)
+    return missing
+
+def parse_json_response(text: str, schema: Optional[Mapping] = None) -> Any:
+    """
+    Parse the JSON in an LLM response.
+
+    Handles prose around the JSON, ```json / ``` fences, trailing commas and Python
+    literals (True/False/None) locally instead of discarding the response. When a schema
+    is given, the result must contain its top-level keys. Outcomes are counted in metrics.
+    """
+    with metrics.span('json_parsing'):
+        return _parse_json_response(text, schema)
+
+def _parse_json_response(text: str, schema: Optional[Mapping]) -> Any:
+    text = (text or "").strip()
+    data = None
+    outcome = 'ok'
+
+    try:
+        data = _loads(text)
+    except ValueError:
+        outcome = 'repaired'
+        extracted = _extract_json_text(text)
+        for candidate in (extracted, _repair(extracted)):
+            try:
+                data = _loads(candidate)
+                break
+            except ValueError:
+                continue
+        else:
+            try:
+                data = ast.literal_eval(extracted)
+            except (ValueError, SyntaxError):
+                _record_outcome('failed')
+                raise ResponseParseError(f"Could not parse JSON from response: {text[:200]}")
+
+    if schema is not None:
+        missing = _missing_keys(data, schema)
+        if missing:
+            _record_outcome('invalid')
+            raise ResponseParseError(f"Response is missing required fields: {missing}")
+
+    _record_outcome(outcome)
+    return data
+
+@lru_cache(maxsize=None)
+def schema_from_format(output_format: str) -> Mapping:
+    """
+    Build the expected structure from an output format in output_config.yaml.
+    The formats are written with escaped braces and placeholders such as True/False.
+    """
+    text = output_format
+    while '{{' in text or '}}' in text:
+        text = text.replace('{{', '{').replace('}}', '}')
+    text = text.replace('True/False', 'true')
+    return json.loads(_repair(_extract_json_text(text)))
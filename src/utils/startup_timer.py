@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+from typing import List, Tuple
+import threading
+import time
+
+class StartupTimer:
+    """Collects wall-clock timings of imports and component initialization."""
+
+    def __init__(self):
+        self.timings: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.timings.append((name, elapsed))
+
+    def report(self) -> str:
+        """Format the recorded timings as a table, slowest first."""
+        with self._lock:
+            timings = sorted(self.timings, key=lambda item: item[1], reverse=True)
+        width = max((len(name) for name, _ in timings), default=10)
+        lines = ["Startup timing report:"]
+        for name, elapsed in timings:
+            lines.append(f"  {name:<{width}}  {elapsed * 1000:9.1f} ms")
+        lines.append(f"  {'total':<{width}}  {sum(elapsed for _, elapsed in timings) * 1000:9.1f} ms")
+        return "\n".join(lines)
+
+# Shared by main.py and the lazily built components
+startup_timer = StartupTimer()
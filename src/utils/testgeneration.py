@@ -1,21 +1,274 @@
+import numpy as np
 import pandas as pd
 import json
 import os
 import random
-from typing import List, Dict, Set, Tuple, Optional
+from collections import deque
+from typing import Callable, List, Dict, Sequence, Set, Tuple, Optional
 
-class TestGenerator:
-    def __init__(self, method1_path: str, method2_path: str, method3_path: str, output_dir: str = 'generated_tests'):
-        """Initialize the test generator with input files and output directory."""
+TEST_COLUMNS = (
+    'test_number', 'method', 'question', 'topic', 'skill', 'correct_answer',
+    'option_a', 'option_b', 'option_c', 'option_d'
+)
+
+TEST_EXPORT_FORMATS = ('csv', 'parquet', 'arrow')
+
+# Low-cardinality pool columns kept as categoricals (dictionary-encoded in Parquet/Arrow)
+CATEGORICAL_COLUMNS = ('method', 'skill', 'topic')
+
+def question_hash(question: str) -> int:
+    """64-bit hash of a question text, equal to the one QuestionPool keys its rows by."""
+    return int(pd.util.hash_array(np.array([question], dtype=object), categorize=False)[0])
+
+def load_question_pool(path: str) -> pd.DataFrame:
+    """
+    Read a question bank from CSV, Parquet or Arrow (.arrow/.feather).
+    
+    Arrow files are memory-mapped and their text columns stay Arrow-backed, so loading
+    is zero-copy and the pages are shared through the OS page cache by every process
+    assembling from the same bank. Parquet is decoded but keeps the same Arrow-backed
+    columns. Skill and topic are categorical either way.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        df = pd.read_csv(path, dtype={'skill': 'category', 'topic': 'category'})
+    elif extension in ('.parquet', '.arrow', '.feather'):
+        import pyarrow as pa
+        if extension == '.parquet':
+            import pyarrow.parquet as pq
+            table = pq.read_table(path, memory_map=True)
+        else:
+            import pyarrow.feather as feather
+            table = feather.read_table(path, memory_map=True)
+        string_types = {
+            pa.string(): pd.ArrowDtype(pa.string()),
+            pa.large_string(): pd.ArrowDtype(pa.large_string())
+        }
+        df = table.to_pandas(types_mapper=string_types.get)
+    else:
+        raise ValueError(f"Unsupported question pool format: {path}")
+    
+    return df.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in df.columns})
+
+def save_question_pool(df: pd.DataFrame, path: str) -> None:
+    """Write a question bank as Parquet or Arrow with categorical columns, e.g. to convert a CSV bank."""
+    df = df.astype({column: 'category' for column in CATEGORICAL_COLUMNS if column in df.columns})
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        df.to_parquet(path, index=False)
+    elif extension in ('.arrow', '.feather'):
+        # Uncompressed so the file can be memory-mapped without decoding
+        df.reset_index(drop=True).to_feather(path, compression='uncompressed')
+    else:
+        raise ValueError(f"Unsupported question pool format: {path}")
+
+class QuestionPool:
+    """
+    Questions of one generation method, indexed by (skill, topic).
+
+    Every (skill, topic) group keeps the rows still available. Using a question
+    swap-removes its rows from their group and clears them in the availability bitmap
+    in O(1), so selecting a question never rescans the DataFrame.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.reset_index(drop=True)
+        # Arrow-backed text stays in its (memory-mapped) buffers; other columns are plain arrays
+        self.columns = {
+            column: values.array if isinstance(values.dtype, pd.ArrowDtype) else values.to_numpy()
+            for column, values in self.df.items()
+        }
+        self.available = np.ones(len(self.df), dtype=bool)
+        self.groups: Dict[str, Dict[str, List[int]]] = {}
+        self._skills = self.df['skill'].tolist()
+        self._topics = self.df['topic'].tolist()
+        
+        # Rows are identified by a 64-bit hash of their question text, so the texts stay in
+        # their (possibly memory-mapped) column; equal texts share a code
+        hashes = pd.util.hash_pandas_object(self.df['question'], index=False).to_numpy()
+        codes, unique_hashes = pd.factorize(hashes)
+        self._question_codes = codes.tolist()
+        self._code_by_hash = dict(zip(unique_hashes.tolist(), range(len(unique_hashes))))
+        _, first_rows, counts = np.unique(codes, return_index=True, return_counts=True)
+        self._first_row = first_rows.tolist()
+        # Code -> all its rows, only for texts on several rows
+        self._duplicate_rows: Dict[int, List[int]] = {}
+        for row in np.flatnonzero(counts[codes] > 1).tolist():
+            self._duplicate_rows.setdefault(self._question_codes[row], []).append(row)
+        
+        slots = np.zeros(len(self.df), dtype=np.int64)
+        grouped = self.df.groupby(['skill', 'topic'], observed=True, sort=False).indices
+        for (skill, topic), rows in grouped.items():
+            self.groups.setdefault(skill, {})[topic] = rows.tolist()
+            slots[rows] = np.arange(len(rows))
+        self._slots = slots.tolist()
+
+    def record(self, row: int) -> Dict:
+        record = {}
+        for column, values in self.columns.items():
+            value = values[row]
+            record[column] = value.item() if isinstance(value, np.generic) else value
+        return record
+
+    def topics_for_skill(self, skill: str) -> Dict[str, List[int]]:
+        """Topics with available questions for skill, mapped to their available rows."""
+        return self.groups.get(skill, {})
+
+    def distinct_questions(self, rows: List[int]) -> int:
+        """Number of different question texts on rows."""
+        return len({self._question_codes[row] for row in rows})
+
+    def mark_used(self, question: str, text_hash: Optional[int] = None) -> None:
+        code = self._code_by_hash.get(question_hash(question) if text_hash is None else text_hash)
+        if code is None:
+            return
+        rows = self._duplicate_rows.get(code, (self._first_row[code],))
+        if self.columns['question'][rows[0]] != question:
+            return  # hash collision with a different text
+        for row in rows:
+            if self.available[row]:
+                self._remove(row)
+
+    def _remove(self, row: int) -> None:
+        self.available[row] = False
+        topic = self._topics[row]
+        topics = self.groups[self._skills[row]]
+        group = topics[topic]
+        
+        # Move the last row of the group into the freed slot
+        slot = self._slots[row]
+        last = group.pop()
+        if last != row:
+            group[slot] = last
+            self._slots[last] = slot
+        if not group:
+            del topics[topic]
 
-        self.method1_df = pd.read_csv(method1_path)
-        self.method1_df['method'] = 'Method 1'
+    def unused(self) -> pd.DataFrame:
+        return self.df[self.available]
+
+    def save_state(self) -> Tuple:
+        return (
+            self.available.copy(),
+            {skill: {topic: list(rows) for topic, rows in topics.items()} for skill, topics in self.groups.items()},
+            list(self._slots)
+        )
+
+    def restore_state(self, state: Tuple) -> None:
+        self.available, self.groups, self._slots = state
+
+def assign_topics(
+    forms: List[int],
+    capacities: Dict[str, int],
+    allowed: Callable[[int, str], bool],
+    preferred: Callable[[int, str], bool],
+    stop_at_first_failure: bool = False
+) -> Dict[int, str]:
+    """
+    Assign a topic to every form, using each topic at most capacities[topic] times and
+    only where allowed(form, topic). This is a bipartite b-matching: forms first take
+    their most preferred free topic, and a form left without one gets a topic through a
+    shortest augmenting path that moves other forms to alternative topics. Returns the
+    largest assignment found, which covers every form whenever that is possible.
+    
+    Topics are tried in the order of capacities, those with preferred(form, topic) first.
+    With stop_at_first_failure the search ends at the first form that cannot be placed,
+    for callers that only accept complete assignments.
+    """
+    topics = [topic for topic, capacity in capacities.items() if capacity > 0]
+    
+    def candidates(form: int):
+        deferred = []
+        for topic in topics:
+            if not allowed(form, topic):
+                continue
+            if preferred(form, topic):
+                yield topic
+            else:
+                deferred.append(topic)
+        yield from deferred
+    
+    assignment: Dict[int, str] = {}
+    holders: Dict[str, Set[int]] = {topic: set() for topic in topics}
+    
+    for form in forms:
+        # Usually a candidate still has spare capacity
+        free_topic = next((topic for topic in candidates(form) if len(holders[topic]) < capacities[topic]), None)
+        if free_topic is not None:
+            holders[free_topic].add(form)
+            assignment[form] = free_topic
+            continue
+        
+        # Otherwise search breadth-first for a chain of forms that can move over
+        topic_parent: Dict[str, int] = {}
+        form_parent: Dict[int, Optional[str]] = {form: None}
+        queue = deque([form])
+        free_topic = None
+        while queue and free_topic is None:
+            current = queue.popleft()
+            for topic in candidates(current):
+                if topic in topic_parent:
+                    continue
+                topic_parent[topic] = current
+                if len(holders[topic]) < capacities[topic]:
+                    free_topic = topic
+                    break
+                for holder in holders[topic]:
+                    if holder not in form_parent:
+                        form_parent[holder] = topic
+                        queue.append(holder)
+        
+        if free_topic is None:
+            if stop_at_first_failure:
+                break
+            continue
         
-        self.method2_df = pd.read_csv(method2_path)
-        self.method2_df['method'] = 'Method 2'
+        # Shift every form on the path to the topic it reached
+        topic = free_topic
+        while topic is not None:
+            current = topic_parent[topic]
+            previous = form_parent[current]
+            if previous is not None:
+                holders[previous].discard(current)
+            holders[topic].add(current)
+            assignment[current] = topic
+            topic = previous
+    
+    return assignment
+
+class TestGenerator:
+    def __init__(
+        self,
+        method1_path: Optional[str] = None,
+        method2_path: Optional[str] = None,
+        method3_path: Optional[str] = None,
+        output_dir: str = 'generated_tests',
+        pools: Optional[Sequence[str]] = None
+    ):
+        """
+        Initialize the test generator with one question bank per generation method and
+        the output directory. Either pass the three banks positionally or any number of
+        banks as pools. Banks can be CSV, Parquet or Arrow (see load_question_pool); the
+        n-th bank is 'Method n' and its questions go under 'method<n>_questions'.
+        """
+        positional = [path for path in (method1_path, method2_path, method3_path) if path is not None]
+        if pools is not None and positional:
+            raise ValueError("Pass the question banks either positionally or as pools, not both")
+        method_paths = list(pools) if pools is not None else positional
+        if not method_paths:
+            raise ValueError("At least one question bank is required")
+
+        self.method_dfs: Dict[str, pd.DataFrame] = {}
+        self.method_keys: Dict[str, str] = {}
+        for number, path in enumerate(method_paths, 1):
+            method = f'Method {number}'
+            method_df = load_question_pool(path)
+            method_df['method'] = pd.Categorical([method] * len(method_df))
+            self.method_dfs[method] = method_df
+            self.method_keys[method] = f'method{number}_questions'
         
-        self.method3_df = pd.read_csv(method3_path)
-        self.method3_df['method'] = 'Method 3'
+        # Selection works on indexed pools instead of filtering the DataFrames
+        self.pools = {method: QuestionPool(method_df) for method, method_df in self.method_dfs.items()}
         
         # Initialize tracking sets and lists
         self.used_questions: Set[str] = set()
@@ -34,125 +287,243 @@ class TestGenerator:
         """Reset the topic-skill combination tracking for a new test."""
         self.current_test_topic_skills = set()
 
-    def select_question(self, method_df: pd.DataFrame, skill: str, test_topics: Set[str]) -> Optional[pd.Series]:
+    def select_question(self, pool: QuestionPool, skill: str, test_topics: Set[str]) -> Optional[Dict]:
         """Try to select a valid question with given constraints."""
-        # Get available questions for this skill
-        mask = (method_df['skill'] == skill) & (~method_df['question'].isin(self.used_questions))
-        available = method_df[mask]
+        # Topics that still have unused questions for this skill
+        available = pool.topics_for_skill(skill)
         
-        if available.empty:
+        if not available:
             return None
         
         # Filter by valid topic-skill combinations
-        valid_questions = available[available.apply(
-            lambda x: f"{x['topic']}_{x['skill']}" not in self.current_test_topic_skills, 
-            axis=1
-        )]
+        valid_questions = {
+            topic: rows for topic, rows in available.items()
+            if f"{topic}_{skill}" not in self.current_test_topic_skills
+        }
         
-        if valid_questions.empty:
+        if not valid_questions:
             # Track these invalid combinations
-            for _, question in available.iterrows():
-                self.invalid_combinations.add(f"{question['topic']}_{question['skill']}")
+            for topic in available:
+                self.invalid_combinations.add(f"{topic}_{skill}")
             return None
             
         # Try to select from unused topics if possible
-        unused_topics = valid_questions[~valid_questions['topic'].isin(test_topics)]
-        selection_pool = unused_topics if not unused_topics.empty else valid_questions
+        unused_topics = {topic: rows for topic, rows in valid_questions.items() if topic not in test_topics}
+        selection_pool = unused_topics or valid_questions
         
-        selected = selection_pool.sample(n=1).iloc[0]
+        # Uniform over questions: weight each topic by its available questions
+        topic = random.choices(list(selection_pool), weights=[len(rows) for rows in selection_pool.values()])[0]
+        rows = selection_pool[topic]
+        selected = pool.record(rows[random.randrange(len(rows))])
         self.current_test_topic_skills.add(f"{selected['topic']}_{selected['skill']}")
         
         return selected
 
-    def generate_method_questions(self, method_df: pd.DataFrame, test_topics: Set[str]) -> List[Dict]:
+    def mark_question_used(self, question: str) -> None:
+        """Exclude a question from every pool; the same text may appear in several methods."""
+        self.used_questions.add(question)
+        text_hash = question_hash(question)
+        for pool in self.pools.values():
+            pool.mark_used(question, text_hash)
+
+    def generate_method_questions(self, pool: QuestionPool, test_topics: Set[str]) -> List[Dict]:
         """Generate questions for one method."""
         method_questions = []
         skills_needed = ['Remember', 'Understand', 'Apply', 'Analyze', 'Evaluate']
         random.shuffle(skills_needed)  # Randomize skill order
         
         for skill in skills_needed:
-            selected = self.select_question(method_df, skill, test_topics)
+            selected = self.select_question(pool, skill, test_topics)
             if selected is None:
                 continue
                 
             test_topics.add(selected['topic'])
-            self.used_questions.add(selected['question'])
+            self.mark_question_used(selected['question'])
             
-            method_questions.append({
-                'question': selected['question'],
-                'skill': selected['skill'],
-                'topic': selected['topic'],
-                'correct_answer': selected['correct_answer'],
-                'options': {
-                    'a': selected['option_a'],
-                    'b': selected['option_b'],
-                    'c': selected['option_c'],
-                    'd': selected['option_d']
-                }
-            })
+            method_questions.append(self.format_question(selected))
         
         return method_questions
 
+    @staticmethod
+    def format_question(selected: Dict) -> Dict:
+        return {
+            'question': selected['question'],
+            'skill': selected['skill'],
+            'topic': selected['topic'],
+            'correct_answer': selected['correct_answer'],
+            'options': {
+                'a': selected['option_a'],
+                'b': selected['option_b'],
+                'c': selected['option_c'],
+                'd': selected['option_d']
+            }
+        }
+
+    def tests_to_dataframe(self, tests: List[Dict], first_test_number: int = 1) -> pd.DataFrame:
+        """One row per question of every test, built column by column in a single pass."""
+        columns = {name: [] for name in TEST_COLUMNS}
+        for test_number, test in enumerate(tests, first_test_number):
+            for method, method_key in self.method_keys.items():
+                for question in test.get(method_key, ()):
+                    options = question['options']
+                    columns['test_number'].append(test_number)
+                    columns['method'].append(method)
+                    columns['question'].append(question['question'])
+                    columns['topic'].append(question['topic'])
+                    columns['skill'].append(question['skill'])
+                    columns['correct_answer'].append(question['correct_answer'])
+                    columns['option_a'].append(options['a'])
+                    columns['option_b'].append(options['b'])
+                    columns['option_c'].append(options['c'])
+                    columns['option_d'].append(options['d'])
+        
+        return pd.DataFrame(columns)
+
     def convert_test_to_dataframe(self, test: Dict, test_number: int) -> pd.DataFrame:
         """Convert a single test from dictionary format to a pandas DataFrame."""
-        rows = []
-        for method_key in ['method1_questions', 'method2_questions', 'method3_questions']:
-            method_number = method_key[6]
-            
-            for question in test[method_key]:
-                rows.append({
-                    'test_number': test_number,
-                    'method': f'Method {method_number}',
-                    'question': question['question'],
-                    'topic': question['topic'],
-                    'skill': question['skill'],
-                    'correct_answer': question['correct_answer'],
-                    'option_a': question['options']['a'],
-                    'option_b': question['options']['b'],
-                    'option_c': question['options']['c'],
-                    'option_d': question['options']['d']
-                })
-        
-        return pd.DataFrame(rows)
-
-    def save_tests(self) -> None:
-        """Save generated tests to files."""
+        return self.tests_to_dataframe([test], test_number)
+
+    def save_tests(self, formats: Tuple[str, ...] = ('csv',), per_test_files: bool = True, write_json: bool = True) -> None:
+        """
+        Save generated tests to files.
+        
+        Args:
+            formats: Formats of the combined table all_tests.*: 'csv', 'parquet' and/or
+                'arrow' (Feather). Parquet and Arrow need pyarrow and keep method, topic
+                and skill as categorical columns.
+            per_test_files: Also write test_<n>.csv for every test
+            write_json: Also write the tests as generated_tests.json
+        """
+        unknown = set(formats) - set(TEST_EXPORT_FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown export formats: {sorted(unknown)}. Choose from {TEST_EXPORT_FORMATS}")
+        
         # Save tests as JSON
-        with open(os.path.join(self.output_dir, 'generated_tests.json'), 'w') as f:
-            json.dump(self.tests, f, indent=2)
+        if write_json:
+            with open(os.path.join(self.output_dir, 'generated_tests.json'), 'w') as f:
+                json.dump(self.tests, f, indent=2)
         
-        # Create individual test CSVs and combined CSV
-        all_tests_df = pd.DataFrame()
+        # Combined table of all tests, built once
+        all_tests_df = self.tests_to_dataframe(self.tests)
         
-        for i, test in enumerate(self.tests, 1):
-            test_df = self.convert_test_to_dataframe(test, i)
-            
-            test_df.to_csv(os.path.join(self.output_dir, f'test_{i}.csv'), index=False)
-            all_tests_df = pd.concat([all_tests_df, test_df])
+        if 'csv' in formats:
+            all_tests_df.to_csv(os.path.join(self.output_dir, 'all_tests.csv'), index=False)
+        
+        if 'parquet' in formats or 'arrow' in formats:
+            columnar_df = all_tests_df.astype({'method': 'category', 'topic': 'category', 'skill': 'category'})
+            if 'parquet' in formats:
+                columnar_df.to_parquet(os.path.join(self.output_dir, 'all_tests.parquet'), index=False)
+            if 'arrow' in formats:
+                columnar_df.to_feather(os.path.join(self.output_dir, 'all_tests.arrow'))
         
-        # Save combined tests
-        all_tests_df.to_csv(os.path.join(self.output_dir, 'all_tests.csv'), index=False)
+        # Individual test CSVs, sliced from the combined table
+        if per_test_files:
+            for test_number, test_df in all_tests_df.groupby('test_number', sort=False):
+                test_df.to_csv(os.path.join(self.output_dir, f'test_{test_number}.csv'), index=False)
 
     def generate_test(self) -> Dict:
-        """Generate one complete test with questions from all three methods."""
+        """Generate one complete test with questions from every method."""
         self.reset_test_constraints()
         test_topics = set()
         
-        methods = [
-            (self.method1_df, 'method1_questions'),
-            (self.method2_df, 'method2_questions'),
-            (self.method3_df, 'method3_questions')
-        ]
+        methods = [(pool, self.method_keys[method]) for method, pool in self.pools.items()]
         random.shuffle(methods)
         
         test = {}
-        for method_df, method_key in methods:
-            test[method_key] = self.generate_method_questions(method_df, test_topics)
+        for pool, method_key in methods:
+            test[method_key] = self.generate_method_questions(pool, test_topics)
         
         return test
 
-    def generate_all_tests(self, num_tests: int) -> None:
-        """Generate specified number of tests."""
+    def assemble_tests(self, num_tests: int, seed: int = 42) -> List[Dict]:
+        """
+        Assemble num_tests complete tests together instead of one at a time.
+        
+        Every test gets one question per skill from every method, no topic-skill pair
+        twice in a test and no question in two tests. For each skill and method the
+        tests are matched to topics with spare questions (see assign_topics), preferring
+        topics the test does not cover yet and topics with many questions left. The
+        result only depends on seed and the pools. Raises ValueError when the pools cannot
+        fill num_tests tests; on any error the pools are left untouched.
+        """
+        rng = random.Random(seed)
+        forms = list(range(num_tests))
+        form_topics: List[Set[str]] = [set() for _ in forms]
+        form_questions: List[Dict[str, Dict[str, Dict]]] = [{method: {} for method in self.pools} for _ in forms]
+        
+        saved_used = set(self.used_questions)
+        saved_pools = {method: pool.save_state() for method, pool in self.pools.items()}
+        try:
+            for skill in self.bloom_levels:
+                skill_topics: List[Set[str]] = [set() for _ in forms]
+                for method, pool in self.pools.items():
+                    available = pool.topics_for_skill(skill)
+                    # A text on several rows is used up by one pick, so count distinct texts
+                    distinct = {topic: pool.distinct_questions(rows) for topic, rows in available.items()}
+                    # Topics with the most questions left first, ties broken by the seed
+                    ranked = sorted(distinct, key=lambda topic: (-distinct[topic], rng.random()))
+                    capacities = {topic: distinct[topic] for topic in ranked}
+                    if sum(capacities.values()) < num_tests:
+                        raise ValueError(
+                            f"Cannot assemble {num_tests} tests: {method} has questions for only "
+                            f"{sum(capacities.values())} tests on skill {skill}"
+                        )
+                    rng.shuffle(forms)
+                    
+                    assignment = assign_topics(
+                        forms,
+                        capacities,
+                        allowed=lambda form, topic: topic not in skill_topics[form],
+                        preferred=lambda form, topic: topic not in form_topics[form],
+                        stop_at_first_failure=True
+                    )
+                    if len(assignment) < num_tests:
+                        raise ValueError(
+                            f"Cannot assemble {num_tests} tests: {method} cannot cover skill {skill} "
+                            f"with a different topic per test"
+                        )
+                    
+                    for form in sorted(assignment):
+                        topic = assignment[form]
+                        # Texts shared with another topic may have emptied this one meanwhile
+                        rows = available.get(topic)
+                        if not rows:
+                            raise ValueError(
+                                f"Cannot assemble {num_tests} tests: {method} ran out of questions "
+                                f"on topic {topic} for skill {skill}"
+                            )
+                        selected = pool.record(rows[rng.randrange(len(rows))])
+                        self.mark_question_used(selected['question'])
+                        skill_topics[form].add(topic)
+                        form_topics[form].add(topic)
+                        form_questions[form][method][skill] = self.format_question(selected)
+        except BaseException:
+            self.used_questions = saved_used
+            for method, pool in self.pools.items():
+                pool.restore_state(saved_pools[method])
+            raise
+        
+        tests = []
+        for questions_by_method in form_questions:
+            skills = list(self.bloom_levels)
+            rng.shuffle(skills)  # Randomize skill order
+            tests.append({
+                self.method_keys[method]: [questions[skill] for skill in skills]
+                for method, questions in questions_by_method.items()
+            })
+        self.tests.extend(tests)
+        return tests
+
+    def generate_all_tests(self, num_tests: int, batch: bool = False, seed: int = 42) -> None:
+        """
+        Generate specified number of tests. With batch=True all tests are assembled
+        together by assemble_tests, so none are skipped.
+        """
+        if batch:
+            self.assemble_tests(num_tests, seed)
+            print(f"Generated {num_tests} tests")
+            return
+        
         for i in range(num_tests):
             try:
                 test = self.generate_test()
@@ -167,11 +538,8 @@ class TestGenerator:
 
     def get_all_unused_questions(self) -> pd.DataFrame:
         """Get all questions that weren't used in tests."""
-        unused_m1 = self.method1_df[~self.method1_df['question'].isin(self.used_questions)]
-        unused_m2 = self.method2_df[~self.method2_df['question'].isin(self.used_questions)]
-        unused_m3 = self.method3_df[~self.method3_df['question'].isin(self.used_questions)]
-        
-        all_unused = pd.concat([unused_m1, unused_m2, unused_m3])
+        # The availability bitmaps already exclude every used question
+        all_unused = pd.concat([pool.unused() for pool in self.pools.values()])
         return all_unused
 
     def save_unused_questions(self) -> None:
@@ -183,7 +551,7 @@ class TestGenerator:
         unused_df = self.get_all_unused_questions()
         
         # Split by method
-        for method in ['Method 1', 'Method 2', 'Method 3']:
+        for method in self.pools:
             method_unused = unused_df[unused_df['method'] == method]
             method_unused.to_csv(
                 os.path.join(unused_dir, f'unused_{method.lower().replace(" ", "_")}.csv'),
@@ -226,7 +594,7 @@ def main():
         'path_to_csv'
     )
     
-    generator.generate_all_tests(15)
+    generator.generate_all_tests(15, batch=True, seed=42)
     
     generator.save_tests()
     
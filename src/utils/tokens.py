@@ -0,0 +1,38 @@
+from typing import Dict, Optional
+import re
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of text. Uses tiktoken's cl100k_base when installed, otherwise an
+    approximation from word and punctuation pieces. Either way it is an estimate for
+    the Llama tokenizer, good enough for budgeting prompts.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return int(len(_TOKEN_PATTERN.findall(text)) * 1.2)
+
+def usage_from_response(response) -> Optional[Dict[str, int]]:
+    """Provider-reported prompt/completion tokens of a chat response, if present."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage:
+        return {
+            'prompt_tokens': usage.get('input_tokens', 0),
+            'completion_tokens': usage.get('output_tokens', 0)
+        }
+    token_usage = (getattr(response, 'response_metadata', None) or {}).get('token_usage')
+    if token_usage:
+        return {
+            'prompt_tokens': token_usage.get('prompt_tokens', 0),
+            'completion_tokens': token_usage.get('completion_tokens', 0)
+        }
+    return None
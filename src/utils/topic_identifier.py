@@ -1,5 +1,5 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_together import ChatTogether
+from src.utils.prompt_templates import compile_chat_prompt
+from src.utils.llm_client import build_llm
 
 class TopicIdentifier:
     """
@@ -19,22 +19,14 @@ class TopicIdentifier:
 
     def _initialize_components(self):
 
-        model_name = self.model_config['model']
-        temperature = self.model_config['temperature']['evaluation_temperature']
-        
-        self.llm = ChatTogether(
-            model=model_name,
-            temperature=temperature
-        )
+        self.llm = build_llm(self.model_config, 'evaluation_temperature', stage='topic_identification')
 
         topic_identifier_prompt = self.prompt_config['prompts']['topic_identifier_prompt']
         
-        self.topic_check = ChatPromptTemplate.from_messages([
+        self.topic_check = compile_chat_prompt((
             ("system", topic_identifier_prompt),
             ("placeholder", "{messages}")
-        ])
-
-        self.chain = self.topic_check | self.llm
+        ))
 
     def identify_topic(self, input_text: str) -> str:
         """
@@ -47,9 +39,10 @@ class TopicIdentifier:
             str: Identified physics topic
         """
         try:
-            result = self.chain.invoke(
-                {"messages": [("user", input_text)]}
+            messages = self.topic_check.format_messages(
+                messages=[("user", input_text)]
             )
+            result = self.llm.invoke(messages)
             
             topic = result.content.strip()
             return topic
@@ -0,0 +1,99 @@
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List
+import csv
+import math
+import re
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'in', 'into',
+    'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'their', 'these', 'this', 'to',
+    'with', 'what', 'which', 'such', 'including', 'between', 'students', 'understand',
+}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stop words removed and a light suffix stemming."""
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower()):
+        if token in STOP_WORDS:
+            continue
+        for suffix in ('ing', 'ion', 'ed', 'es', 's'):
+            if token.endswith(suffix) and len(token) - len(suffix) >= 4:
+                token = token[:-len(suffix)]
+                break
+        tokens.append(token)
+    return tokens
+
+@dataclass(frozen=True)
+class TopicCandidate:
+    topic_id: str
+    topic_name: str
+    score: float
+
+class TopicIndex:
+    """
+    BM25 index over concept map topic names and descriptions.
+
+    Used to shortlist the topics most likely to match a query, so the LLM only has to
+    disambiguate between a handful of candidates instead of the whole topic table.
+    Topic names are weighted more heavily than descriptions.
+    """
+
+    def __init__(self, topics: List[Dict[str, str]], name_weight: int = 3, k1: float = 1.5, b: float = 0.75):
+        self.topics = topics
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies: List[Counter] = []
+        document_frequency: Counter = Counter()
+
+        for topic in topics:
+            tokens = tokenize(topic.get('topic_name', '')) * name_weight
+            tokens += tokenize(topic.get('description', ''))
+            frequencies = Counter(tokens)
+            self.term_frequencies.append(frequencies)
+            document_frequency.update(frequencies.keys())
+
+        self.lengths = [sum(frequencies.values()) for frequencies in self.term_frequencies]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        count = len(topics)
+        self.idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+        self.topic_ids = {topic['topic_id'] for topic in topics}
+
+    @classmethod
+    def from_csv(cls, topics_csv: str) -> "TopicIndex":
+        with open(topics_csv, newline='', encoding='utf-8') as f:
+            topics = [row for row in csv.DictReader(f) if row.get('topic_id')]
+        return cls(topics)
+
+    def search(self, query: str, k: int = 20) -> List[TopicCandidate]:
+        """Return up to k topics ranked by BM25 score; topics with no overlap are left out."""
+        query_terms = set(tokenize(query))
+        scored = []
+        for index, frequencies in enumerate(self.term_frequencies):
+            score = 0.0
+            length_norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.average_length or 1))
+            for term in query_terms:
+                frequency = frequencies.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + length_norm)
+            if score > 0:
+                scored.append((score, index))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [
+            TopicCandidate(self.topics[index]['topic_id'], self.topics[index]['topic_name'], score)
+            for score, index in scored[:k]
+        ]
+
+    def search_all(self) -> List[TopicCandidate]:
+        """Every topic, in file order."""
+        return [TopicCandidate(topic['topic_id'], topic['topic_name'], 0.0) for topic in self.topics]
+
+@lru_cache(maxsize=None)
+def load_topic_index(topics_csv: str) -> TopicIndex:
+    """Build the index for topics_csv once per process."""
+    return TopicIndex.from_csv(topics_csv)
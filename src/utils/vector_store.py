@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from langchain_community.vectorstores import Chroma
+from src.utils.metrics import metrics
+from src.utils.startup_timer import startup_timer
+from typing import Dict, List, Tuple
+import os
+import threading
+
+class SharedVectorStore:
+    """
+    Process-wide Chroma store shared by all generator instances and threads.
+
+    The store is opened once per persist directory and keeps one retriever per top_k.
+    Search results are cached per (query, top_k), and concurrent identical searches
+    wait for the one already in flight instead of running again.
+    """
+
+    _instances: Dict[str, "SharedVectorStore"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, persist_directory: str, embedding_function, cache_size: int = 256):
+        if not os.path.exists(persist_directory):
+            raise ValueError(f"Vector store directory {persist_directory} does not exist")
+
+        print(f"Opening vector store in: {persist_directory}")
+        self.persist_directory = persist_directory
+        self.db = Chroma(
+            persist_directory=persist_directory,
+            embedding_function=embedding_function,
+        )
+        self.cache_size = cache_size
+        self._retrievers = {}
+        self._results: "OrderedDict[Tuple[str, int], List]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], Future] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, persist_directory: str, embedding_function, cache_size: int = 256) -> "SharedVectorStore":
+        """Return the shared store for persist_directory, opening it on first use."""
+        persist_directory = os.path.abspath(persist_directory)
+        with cls._instances_lock:
+            if persist_directory not in cls._instances:
+                with startup_timer.measure("lazy:vector_store"):
+                    cls._instances[persist_directory] = cls(persist_directory, embedding_function, cache_size)
+            return cls._instances[persist_directory]
+
+    def get_retriever(self, top_k: int):
+        with self._lock:
+            if top_k not in self._retrievers:
+                self._retrievers[top_k] = self.db.as_retriever(
+                    search_type="similarity",
+                    search_kwargs={"k": top_k}
+                )
+            return self._retrievers[top_k]
+
+    def search(self, query: str, top_k: int) -> List:
+        """Return the top_k documents for query, reusing cached and in-flight searches."""
+        key = (query, top_k)
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                metrics.increment('vector_retrieval', 'cache_hits')
+                return self._results[key]
+
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            documents = self.get_retriever(top_k).invoke(query)
+        except Exception as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+            self._results[key] = documents
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+        future.set_result(documents)
+        return documents